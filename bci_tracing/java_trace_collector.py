@@ -5,10 +5,48 @@ Provides execution trace collection using bci_injector.jar
 import os
 import subprocess
 import json
+import re
+import shutil
 import time
+import uuid
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+# Marker lines the batch driver prints around each traced main class
+BATCH_DELIMITER = "@@BCI_BATCH@@"
+BATCH_DRIVER_CLASS = "BciBatchDriver"
+
+# Runs the main method of every class named on the command line inside a
+# single JVM, so the agent and JVM startup cost is paid once per batch instead
+# of once per Java file. Markers go to both streams so stdout and stderr can
+# be split per class; stdin is left to the traced programs.
+BATCH_DRIVER_SOURCE = """
+import java.lang.reflect.InvocationTargetException;
+
+public class BciBatchDriver {
+    public static void main(String[] args) throws Exception {
+        for (String name : args) {
+            System.out.println("%(delim)s BEGIN " + name);
+            System.err.println("%(delim)s BEGIN " + name);
+            String status = "OK";
+            try {
+                Class.forName(name).getMethod("main", String[].class).invoke(null, (Object) new String[0]);
+            } catch (InvocationTargetException e) {
+                e.getCause().printStackTrace(System.out);
+                status = "FAIL";
+            } catch (Throwable t) {
+                t.printStackTrace(System.out);
+                status = "FAIL";
+            }
+            System.out.flush();
+            System.err.flush();
+            System.out.println("%(delim)s END " + name + " " + status);
+            System.err.println("%(delim)s END " + name + " " + status);
+        }
+    }
+}
+""" % {"delim": BATCH_DELIMITER}
+
 class JavaTraceCollector:
     def __init__(self, bci_jar_path: str, config_dir: str = "bci_conf", output_dir: str = "experiments/java-traces"):
         self.bci_jar_path = bci_jar_path
@@ -36,7 +74,6 @@ class JavaTraceCollector:
                     content = f.read()
                     
                 # Extract package declarations
-                import re
                 package_match = re.search(r'package\s+([a-zA-Z_][a-zA-Z0-9_.]*);', content)
                 if package_match:
                     packages.add(package_match.group(1))
@@ -66,6 +103,161 @@ class JavaTraceCollector:
         
         return filter_path
     
+    @staticmethod
+    def main_class_for(java_file: str) -> str:
+        """Return the fully qualified main class name for a Java file"""
+        try:
+            with open(java_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception:
+            content = ""
+        package_match = re.search(r'package\s+([a-zA-Z_][a-zA-Z0-9_.]*);', content)
+        stem = Path(java_file).stem
+        return f"{package_match.group(1)}.{stem}" if package_match else stem
+
+    def run_java_batch_with_bci(self, java_files: List[str], debug_logs: bool = False,
+                                write_after_events: int = 1, timeout_per_file: int = 30) -> List[Dict[str, Any]]:
+        """
+        Run several Java files with BCI instrumentation in one JVM
+
+        All files are compiled into a shared classes directory, then a small
+        driver class takes the main class names as arguments and invokes each
+        in turn. Every file shares one trace file; per-file trace analysis is
+        obtained by filtering events on the classes the file declares.
+
+        Returns:
+            List of per-file result dictionaries, in the same order as java_files
+        """
+        if not os.path.exists(self.bci_jar_path):
+            raise FileNotFoundError(f"BCI jar not found at {self.bci_jar_path}")
+
+        # Per-run suffix so concurrent batches never share a filter, trace or classes dir
+        run_id = uuid.uuid4().hex[:8]
+        filter_path = self.create_inclusion_filter(java_files, filter_name=f"bci_java_batch_{run_id}.txt")
+        timestamp = int(time.time())
+        trace_file = os.path.abspath(os.path.join(self.output_dir, f"trace_batch_{timestamp}_{run_id}.csv"))
+        classes_dir = os.path.abspath(os.path.join(self.output_dir, f"classes_{timestamp}_{run_id}"))
+        try:
+            results = self._run_batch(java_files, filter_path, trace_file, classes_dir,
+                                      debug_logs, write_after_events, timeout_per_file)
+        finally:
+            try:
+                os.remove(filter_path)
+            except OSError:
+                pass
+            shutil.rmtree(classes_dir, ignore_errors=True)
+
+        # A class that calls System.exit or crashes the JVM ends the batch early;
+        # every class that did not finish there gets a JVM of its own instead
+        for java_file, result in results.items():
+            if result.pop("rerun", False):
+                print(f"Re-running {java_file} outside the batch JVM...")
+                results[java_file] = self.run_java_with_bci(java_file, main_class=self.main_class_for(java_file),
+                                                            debug_logs=debug_logs,
+                                                            write_after_events=write_after_events)
+
+        return [results.get(java_file, {"success": False, "error": "Not run", "trace_file": None})
+                for java_file in java_files]
+
+    def _run_batch(self, java_files: List[str], filter_path: str, trace_file: str, classes_dir: str,
+                   debug_logs: bool, write_after_events: int, timeout_per_file: int) -> Dict[str, Dict[str, Any]]:
+        """Compile java_files into classes_dir and trace them all in one driver JVM"""
+        Path(classes_dir).mkdir(parents=True, exist_ok=True)
+
+        driver_path = os.path.join(classes_dir, f"{BATCH_DRIVER_CLASS}.java")
+        with open(driver_path, 'w', encoding='utf-8') as f:
+            f.write(BATCH_DRIVER_SOURCE)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        compiled = []
+        try:
+            # One javac for the whole batch; fall back to per-file compiles so a
+            # single broken file does not keep the others from being traced
+            batch_compile = subprocess.run(
+                ["javac", "-d", classes_dir, driver_path] + [os.path.abspath(p) for p in java_files],
+                capture_output=True, text=True
+            )
+            if batch_compile.returncode == 0:
+                compiled = list(java_files)
+            else:
+                subprocess.run(["javac", "-d", classes_dir, driver_path], capture_output=True, text=True, check=True)
+                for java_file in java_files:
+                    compile_result = subprocess.run(
+                        ["javac", "-d", classes_dir, "-cp", classes_dir, os.path.abspath(java_file)],
+                        capture_output=True, text=True
+                    )
+                    if compile_result.returncode == 0:
+                        compiled.append(java_file)
+                    else:
+                        results[java_file] = {
+                            "success": False,
+                            "error": f"Compilation failed: {compile_result.stderr}",
+                            "trace_file": None
+                        }
+        except Exception as e:
+            return {java_file: {"success": False, "error": str(e), "trace_file": None} for java_file in java_files}
+
+        main_classes = {java_file: self.main_class_for(java_file) for java_file in compiled}
+        java_cmd = [
+            "java",
+            f"-javaagent:{self.bci_jar_path}={filter_path};{trace_file};{str(debug_logs).lower()};{write_after_events}",
+            "-cp", classes_dir,
+            BATCH_DRIVER_CLASS
+        ] + list(main_classes.values())
+        print(f"Running Java with BCI (batch of {len(main_classes)}): {' '.join(java_cmd)}")
+
+        stdout, stderr, return_code, error = "", "", None, None
+        if main_classes:
+            proc = subprocess.Popen(java_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout_per_file * len(main_classes))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                stdout, stderr = proc.communicate()
+                error = "Execution timed out"
+            return_code = proc.returncode
+
+        segments, statuses = self._split_batch_output(stdout)
+        err_segments, _ = self._split_batch_output(stderr)
+
+        have_trace = os.path.exists(trace_file)
+        for java_file, main_class in main_classes.items():
+            status = statuses.get(main_class)
+            result = {
+                "success": status == "OK",
+                "stdout": "\n".join(segments.get(main_class, [])),
+                "stderr": "\n".join(err_segments.get(main_class, [])),
+                "trace_file": trace_file if have_trace else None,
+                "return_code": return_code
+            }
+            if status is None:
+                # The class left the JVM without finishing; rerun it alone unless
+                # it is the one the batch timed out on
+                result["error"] = error or "Class did not run in batch JVM"
+                result["rerun"] = not (error and main_class in segments)
+            results[java_file] = result
+
+        return results
+
+    @staticmethod
+    def _split_batch_output(output: str):
+        """Split one driver stream into per-class lines and END statuses"""
+        segments: Dict[str, List[str]] = {}
+        statuses: Dict[str, str] = {}
+        current = None
+        for line in output.splitlines():
+            if line.startswith(BATCH_DELIMITER):
+                parts = line.split()
+                if len(parts) >= 3 and parts[1] == "BEGIN":
+                    current = parts[2]
+                    segments[current] = []
+                elif len(parts) >= 4 and parts[1] == "END":
+                    statuses[parts[2]] = parts[3]
+                    current = None
+            elif current is not None:
+                segments[current].append(line)
+        return segments, statuses
+
     def run_java_with_bci(self, java_file: str, main_class: str = None, 
                          debug_logs: bool = False, write_after_events: int = 1) -> Dict[str, Any]:
         """
@@ -83,21 +275,29 @@ class JavaTraceCollector:
         if not os.path.exists(self.bci_jar_path):
             raise FileNotFoundError(f"BCI jar not found at {self.bci_jar_path}")
         
+        # Per-run suffix so concurrent runs never share a filter or trace file
+        run_id = uuid.uuid4().hex[:8]
+        
         # Create inclusion filter
-        filter_path = self.create_inclusion_filter([java_file])
+        filter_path = self.create_inclusion_filter([java_file], filter_name=f"bci_java_{run_id}.txt")
         
-        # Generate trace file name
+        # Generate trace file name; absolute, as the JVM runs from the source directory
         timestamp = int(time.time())
-        trace_file = os.path.join(self.output_dir, f"trace_{timestamp}.csv")
+        trace_file = os.path.abspath(os.path.join(self.output_dir, f"trace_{timestamp}_{run_id}.csv"))
+        
+        # Per-run output directory, so concurrent runs on files in one folder
+        # never overwrite each other's .class files
+        classes_dir = os.path.abspath(os.path.join(self.output_dir, f"classes_{timestamp}_{run_id}"))
         
         # Determine main class
         if main_class is None:
-            main_class = Path(java_file).stem
+            main_class = self.main_class_for(java_file)
         
         # Build Java command with BCI agent
         java_cmd = [
             "java",
             f"-javaagent:{self.bci_jar_path}={filter_path};{trace_file};{str(debug_logs).lower()};{write_after_events}",
+            "-cp", classes_dir,
             main_class
         ]
         
@@ -105,8 +305,9 @@ class JavaTraceCollector:
         
         try:
             # Compile Java file first
+            Path(classes_dir).mkdir(parents=True, exist_ok=True)
             compile_result = subprocess.run(
-                ["javac", java_file],
+                ["javac", "-d", classes_dir, os.path.abspath(java_file)],
                 capture_output=True,
                 text=True,
                 cwd=os.path.dirname(java_file) or "."
@@ -148,10 +349,19 @@ class JavaTraceCollector:
                 "error": str(e),
                 "trace_file": None
             }
+        finally:
+            try:
+                os.remove(filter_path)
+            except OSError:
+                pass
+            shutil.rmtree(classes_dir, ignore_errors=True)
     
-    def analyze_trace_file(self, trace_file: str) -> Dict[str, Any]:
+    def analyze_trace_file(self, trace_file: str, classes: Optional[set] = None) -> Dict[str, Any]:
         """
         Analyze BCI trace file and extract execution patterns
+
+        If classes is given, only events for those classes (or their inner
+        classes) are kept; used to slice a shared batch trace per file.
         """
         if not os.path.exists(trace_file):
             return {"error": "Trace file not found"}
@@ -167,6 +377,8 @@ class JavaTraceCollector:
                     # Basic CSV parsing - adjust based on actual BCI output format
                     parts = line.strip().split(',')
                     if len(parts) >= 3:
+                        if classes is not None and parts[1].replace('/', '.').split('$')[0] not in classes:
+                            continue
                         events.append({
                             "timestamp": parts[0] if len(parts) > 0 else "",
                             "class": parts[1] if len(parts) > 1 else "",
@@ -230,9 +442,12 @@ def scan_java_folder_with_bci(folder_path: str, bci_jar_path: str) -> List[Dict[
     
     return results
 
-def scan_paths_with_bci(paths: List[str], bci_jar_path: str) -> List[Dict[str, Any]]:
+def scan_paths_with_bci(paths: List[str], bci_jar_path: str, batch_mode: bool = True) -> List[Dict[str, Any]]:
     """
     Scan list of paths for Java files and run BCI analysis on each
+
+    With batch_mode, all files are traced in a single JVM; files whose main
+    class name collides with an earlier file are traced on their own.
     """
     collector = JavaTraceCollector(bci_jar_path)
     results = []
@@ -255,19 +470,51 @@ def scan_paths_with_bci(paths: List[str], bci_jar_path: str) -> List[Dict[str, A
     
     print(f"Found {len(java_files)} Java files to analyze")
     
+    batch_files = []
+    if batch_mode and len(java_files) > 1:
+        seen_classes = set()
+        for java_file in java_files:
+            main_class = collector.main_class_for(java_file)
+            if main_class not in seen_classes:
+                seen_classes.add(main_class)
+                batch_files.append(java_file)
+    
+    batch_results = {}
+    if batch_files:
+        print(f"Analyzing {len(batch_files)} files in one JVM...")
+        for java_file, result in zip(batch_files, collector.run_java_batch_with_bci(batch_files)):
+            if result["success"] and result["trace_file"]:
+                declared = _declared_classes(java_file)
+                result["trace_analysis"] = collector.analyze_trace_file(result["trace_file"], classes=declared)
+            batch_results[java_file] = result
+    
     for java_file in java_files:
-        print(f"Analyzing {java_file}...")
-        result = collector.run_java_with_bci(java_file)
-        
-        if result["success"] and result["trace_file"]:
-            trace_analysis = collector.analyze_trace_file(result["trace_file"])
-            result["trace_analysis"] = trace_analysis
+        result = batch_results.get(java_file)
+        if result is None:
+            print(f"Analyzing {java_file}...")
+            result = collector.run_java_with_bci(java_file)
+            
+            if result["success"] and result["trace_file"]:
+                trace_analysis = collector.analyze_trace_file(result["trace_file"])
+                result["trace_analysis"] = trace_analysis
         
         result["java_file"] = java_file
         results.append(result)
     
     return results
 
+def _declared_classes(java_file: str) -> set:
+    """Return the fully qualified names of the classes declared in a Java file"""
+    try:
+        with open(java_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception:
+        return set()
+    package_match = re.search(r'package\s+([a-zA-Z_][a-zA-Z0-9_.]*);', content)
+    prefix = f"{package_match.group(1)}." if package_match else ""
+    class_matches = re.findall(r'(?:public\s+)?(?:class|interface|enum)\s+([a-zA-Z_][a-zA-Z0-9_]*)', content)
+    return {prefix + name for name in class_matches}
+
 if __name__ == "__main__":
     # Test the collector
     bci_jar = "bci_injector.jar"  # Place BCI jar in project root
@@ -15,6 +15,8 @@ import ast
 import re
 from typing import List, Dict, Any, Optional, Set, Tuple
 
+from .static_rules import walk_ast
+
 class LogicalBugChecker:
     """AST-based logical bug detector"""
     
@@ -44,7 +46,7 @@ class LogicalBugChecker:
     def _analyze_tree(self, tree: ast.AST, source_code: str):
         """Walk AST and check for logical bugs"""
         
-        for node in ast.walk(tree):
+        for node in walk_ast(tree):
             if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
                 self.current_function = node.name
                 self._check_function_logic(node, source_code)
@@ -81,7 +83,7 @@ class LogicalBugChecker:
         
         # Find actual returns
         actual_returns = []
-        for child in ast.walk(node):
+        for child in walk_ast(node):
             if isinstance(child, ast.Return) and child.value is not None:
                 actual_returns.append(child)
         
@@ -102,7 +104,7 @@ class LogicalBugChecker:
         
         # Find actual raises
         actual_raises = []
-        for child in ast.walk(node):
+        for child in walk_ast(node):
             if isinstance(child, ast.Raise):
                 actual_raises.append(child)
         
@@ -153,7 +155,7 @@ class LogicalBugChecker:
         }
         
         # Extract variable names
-        for child in ast.walk(node):
+        for child in walk_ast(node):
             if isinstance(child, ast.Name):
                 info["variables"].add(child.id)
             if isinstance(child, ast.Compare):
@@ -10,6 +10,8 @@ No training here; just a weighted scoring mechanism for prototype demonstration.
 import math
 import re
 
+import numpy as np
+
 def tokenize(code):
     """
     Simple tokenizer that splits by whitespace but keeps operators.
@@ -90,47 +92,81 @@ def structural_similarity(f_a, f_b):
             diffs.append(1.0 - abs(a - b) / (max(a, b) + 1e-6))
     return sum(diffs) / len(diffs)
 
+# feature keys every Python function / Java method record carries
+STRUCT_FEATURES = ("num_statements", "num_branches")
+
+def feature_columns(snippet_records, keys=STRUCT_FEATURES):
+    """
+    Structure-of-arrays view of snippet features: a (len(snippet_records), len(keys))
+    float64 array, one column per key. None if some record's features are not
+    exactly keys (structural_similarity must then intersect keys pair by pair).
+    """
+    key_set = set(keys)
+    rows = []
+    for rec in snippet_records:
+        feats = rec.get("features") or {}
+        if feats.keys() != key_set:
+            return None
+        rows.append([feats[k] for k in keys])
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(keys))
+
+def structural_similarity_batch(columns, idx_a, idx_b):
+    """
+    structural_similarity for many pairs at once: rows idx_a vs rows idx_b of a
+    feature_columns array. Returns a float64 array with one score per pair.
+    """
+    a = columns[idx_a]
+    b = columns[idx_b]
+    diffs = np.where(a + b == 0, 0.0, 1.0 - np.abs(a - b) / (np.maximum(a, b) + 1e-6))
+    return diffs.mean(axis=1)
+
 def fusion_score(struct_sim, semantic_sim, dynamic_anomaly, weights=(0.3, 0.5, 0.2)):
     """
     Legacy wrapper for backward compatibility.
     """
     return fusion_score_detailed(struct_sim, semantic_sim, dynamic_anomaly, code_a="", code_b="", weights=weights)[0]
 
-def fusion_score_detailed(struct_sim, semantic_sim, dynamic_anomaly, code_a="", code_b="", weights=(0.3, 0.5, 0.2)):
+def pair_similarity_metrics(code_a, code_b, semantic_sim):
     """
-    Returns (score, components_dict, explanation_str)
-    Now uses code content to calculate BCE metrics.
+    Returns (line_similarity, token_similarity, clone_type) for a pair.
     """
-    w_s, w_sem, w_d = weights
-    
-    # 1. Compute BCE metrics
     if code_a and code_b:
         line_sim, token_sim = compute_similarity_metrics(code_a, code_b)
-        clone_type, type_conf = classify_clone_type(line_sim, token_sim, semantic_sim)
+        clone_type, _ = classify_clone_type(line_sim, token_sim, semantic_sim)
     else:
         # Fallback if code not provided (legacy behavior)
         line_sim, token_sim = 0.0, 0.0
-        clone_type, type_conf = "Unknown (No Code)", 0.0
+        clone_type = "Unknown (No Code)"
+    return line_sim, token_sim, clone_type
+
+def fusion_scores_batch(struct_sims, semantic_sims, dynamic_flags, line_sims, token_sims, weights=(0.3, 0.5, 0.2)):
+    """
+    Fusion score for many pairs at once (fusion_score_detailed scores one pair
+    through it). All arguments are equal-length sequences; returns a float64
+    array of scores in [0, 1].
+    """
+    w_s, w_sem, w_d = weights
+    struct_sims = np.asarray(struct_sims, dtype=np.float64)
+    semantic_sims = np.asarray(semantic_sims, dtype=np.float64)
+    dynamic_flags = np.asarray(dynamic_flags, dtype=bool)
+    syntactic_sims = np.maximum(np.asarray(line_sims, dtype=np.float64), np.asarray(token_sims, dtype=np.float64))
+
+    base_scores = w_s * struct_sims + w_sem * semantic_sims + w_d * dynamic_flags.astype(np.float64)
 
-    # 2. Adjust Score logic
-    # If it's a strong syntactic match (Type-1/2/3-Strong), boost the score towards 1.0
+    # Strong syntax overrides everything, strong semantics overrides weak syntax (Type-4)
+    final_scores = np.where(
+        syntactic_sims > 0.7, np.maximum(base_scores, syntactic_sims),
+        np.where(semantic_sims > 0.8, np.maximum(base_scores, semantic_sims), base_scores)
+    )
+    return np.clip(final_scores, 0.0, 1.0)
+
+def fusion_components(struct_sim, semantic_sim, dynamic_anomaly, line_sim, token_sim, clone_type, weights=(0.3, 0.5, 0.2)):
+    """
+    Returns (components_dict, explanation_str) for a scored pair.
+    """
+    w_s, w_sem, w_d = weights
     syntactic_sim = max(line_sim, token_sim)
-    
-    # Base score from features
-    base_score = w_s * struct_sim + w_sem * semantic_sim + w_d * (1.0 if dynamic_anomaly else 0.0)
-    
-    # Boost based on precise syntax
-    if syntactic_sim > 0.7:
-        # Strong syntax overrides everything
-        final_score = max(base_score, syntactic_sim)
-    elif semantic_sim > 0.8:
-        # Strong semantic overrides weak syntax (Type-4)
-        final_score = max(base_score, semantic_sim)
-    else:
-        final_score = base_score
 
-    final_score = max(0.0, min(1.0, final_score))
-    
     components = {
         "structural": struct_sim,
         "semantic": semantic_sim,
@@ -157,6 +193,22 @@ def fusion_score_detailed(struct_sim, semantic_sim, dynamic_anomaly, code_a="",
         
     explanation = "Clone detected: " + ", ".join(reasons)
     
+    return components, explanation
+
+def fusion_score_detailed(struct_sim, semantic_sim, dynamic_anomaly, code_a="", code_b="", weights=(0.3, 0.5, 0.2)):
+    """
+    Returns (score, components_dict, explanation_str)
+    Now uses code content to calculate BCE metrics.
+    """
+    # 1. Compute BCE metrics
+    line_sim, token_sim, clone_type = pair_similarity_metrics(code_a, code_b, semantic_sim)
+
+    # 2. Weighted score with syntax/semantic boosts, shared with the batch path
+    final_score = float(fusion_scores_batch([struct_sim], [semantic_sim], [dynamic_anomaly],
+                                            [line_sim], [token_sim], weights)[0])
+    
+    components, explanation = fusion_components(struct_sim, semantic_sim, dynamic_anomaly, line_sim, token_sim, clone_type, weights)
+    
     return final_score, components, explanation
 
 # utilities to build snippet records from AST results
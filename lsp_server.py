@@ -14,9 +14,13 @@ import ast
 import json
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Set
+import itertools
+from itertools import islice
+from typing import List, Dict, Any, Optional, Set, Iterator
 from pathlib import Path
 
+import numpy as np
+
 # Add prototype root to path so we can import our analysis modules
 _PROTO_ROOT = os.path.dirname(os.path.abspath(__file__))
 if _PROTO_ROOT not in sys.path:
@@ -51,13 +55,32 @@ try:
 except ImportError:
     extract_python_functions = None
 
+# Optional: JIT-compiled pairwise clone kernel
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    prange = range
+    _HAS_NUMBA = False
+
 # ────────────────────────────────────────────────────────────────
 # Clone Detection (lightweight Jaccard, no ML model)
 # ────────────────────────────────────────────────────────────────
 
+# 256-byte translation table: lowercases ASCII letters and maps every
+# non-word byte to a space, so ASCII tokenizing is one C-level translate + split
+_ASCII_TOKEN_TABLE = bytes(
+    ord(chr(c).lower()) if (chr(c).isalnum() or c == ord("_")) and c < 128 else ord(" ")
+    for c in range(256)
+)
+_NON_WORD_RE = re.compile(r"\W+")
+
+
 def _tokenize(code: str) -> Set[str]:
     """Split code into token set for Jaccard similarity."""
-    tokens = set(re.split(r"\W+", code.lower()))
+    if code.isascii():
+        return set(code.encode("ascii").translate(_ASCII_TOKEN_TABLE).decode("ascii").split())
+    tokens = set(_NON_WORD_RE.split(code.lower()))
     tokens.discard("")
     return tokens
 
@@ -73,6 +96,89 @@ def jaccard_similarity(a: str, b: str) -> float:
     return intersection / union if union > 0 else 0.0
 
 
+def _token_array(code: str) -> np.ndarray:
+    """Sorted, unique int64 token hashes — a compact stand-in for the token set."""
+    arr = np.fromiter((hash(t) for t in _tokenize(code)), dtype=np.int64)
+    arr.sort()
+    return arr
+
+
+def jaccard_arr(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard similarity of two sorted unique token-hash arrays."""
+    if a.size == 0 or b.size == 0:
+        return 0.0
+    inter = np.intersect1d(a, b, assume_unique=True).size
+    return inter / (a.size + b.size - inter)
+
+
+def _pair_jaccard_kernel(offsets, data, thresh, row0, out):
+    """
+    Jaccard of rows row0 .. row0 + out.shape[0] against every later row, over
+    CSR-packed sorted token arrays (row i spans data[offsets[i]:offsets[i+1]]).
+    out[r, j] holds the score of pair (row0 + r, j) for j > row0 + r and -inf
+    elsewhere, so no threshold selects self-pairs or mirrored pairs. Pairs
+    whose size ratio already rules out ``thresh`` are scored 0.
+    """
+    n = offsets.size - 1
+    for r in prange(out.shape[0]):
+        i = row0 + r
+        a0 = offsets[i]
+        a1 = offsets[i + 1]
+        la = a1 - a0
+        for j in range(i + 1):
+            out[r, j] = -np.inf
+        for j in range(i + 1, n):
+            b0 = offsets[j]
+            b1 = offsets[j + 1]
+            lb = b1 - b0
+            # Jaccard <= min/max size, so skip pairs that can't reach thresh
+            if la == 0 or lb == 0 or min(la, lb) < thresh * max(la, lb):
+                out[r, j] = 0.0
+                continue
+            # two-pointer merge counts common hashes without allocating
+            p = a0
+            q = b0
+            inter = 0
+            while p < a1 and q < b1:
+                x = data[p]
+                y = data[q]
+                if x == y:
+                    inter += 1
+                    p += 1
+                    q += 1
+                elif x < y:
+                    p += 1
+                else:
+                    q += 1
+            out[r, j] = inter / (la + lb - inter)
+
+
+if _HAS_NUMBA:
+    # Eager signature: compiled (or loaded from the on-disk cache) at import, and
+    # callers' arguments are converted to it rather than triggering a fresh JIT of
+    # another specialization mid-analysis. Cache files go to __pycache__, or to
+    # NUMBA_CACHE_DIR when set (e.g. for read-only installs and CI caching).
+    _pair_jaccard = njit(
+        "void(int64[::1], int64[::1], float64, int64, float64[:, ::1])",
+        parallel=True,
+        cache=True,
+    )(_pair_jaccard_kernel)
+
+# Score-buffer budget per kernel call: rows are scored in blocks of about this
+# many cells (32 MB of float64), so memory stays flat however many functions
+# the workspace holds instead of growing with the n*(n-1)/2 pair count.
+_PAIR_BLOCK_CELLS = 1 << 22
+
+
+def _clone_side(func: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "file": func["file"],
+        "name": func["name"],
+        "start": func["start"],
+        "end": func["end"],
+    }
+
+
 def find_clones_in_functions(
     functions: List[Dict[str, Any]], threshold: float = 0.75
 ) -> List[Dict[str, Any]]:
@@ -80,35 +186,56 @@ def find_clones_in_functions(
     Compare all function pairs and return those above the similarity threshold.
     Each function dict must have: file, name, start, end, code.
     """
-    clones = []
     n = len(functions)
-    for i in range(n):
-        code_a = functions[i].get("code", "")
-        if not code_a or len(code_a.strip()) < 20:
-            continue
-        for j in range(i + 1, n):
-            code_b = functions[j].get("code", "")
-            if not code_b or len(code_b.strip()) < 20:
-                continue
-            score = jaccard_similarity(code_a, code_b)
-            if score >= threshold:
-                clones.append(
-                    {
-                        "a": {
-                            "file": functions[i]["file"],
-                            "name": functions[i]["name"],
-                            "start": functions[i]["start"],
-                            "end": functions[i]["end"],
-                        },
-                        "b": {
-                            "file": functions[j]["file"],
-                            "name": functions[j]["name"],
-                            "start": functions[j]["start"],
-                            "end": functions[j]["end"],
-                        },
-                        "score": round(score, 4),
-                    }
-                )
+    if n < 2:
+        return []
+
+    # Too-short snippets are never clone candidates
+    eligible = np.array(
+        [len(f.get("code", "").strip()) >= 20 for f in functions], dtype=bool
+    )
+    empty = np.empty(0, dtype=np.int64)
+    arrays = [
+        (f["_tok_arr"] if "_tok_arr" in f else _token_array(f.get("code", "")))
+        if ok else empty
+        for f, ok in zip(functions, eligible)
+    ]
+
+    hits = []
+    if _HAS_NUMBA:
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([a.size for a in arrays], out=offsets[1:])
+        data = np.concatenate(arrays)
+        block_rows = max(1, _PAIR_BLOCK_CELLS // n)
+        scores = np.empty((min(block_rows, n), n), dtype=np.float64)
+        for row0 in range(0, n - 1, block_rows):
+            block = scores[: min(block_rows, n - row0)]
+            _pair_jaccard(offsets, data, threshold, row0, block)
+            for r, j in zip(*np.nonzero(block >= threshold)):
+                i, j = row0 + int(r), int(j)
+                if eligible[i] and eligible[j]:
+                    hits.append((i, j, float(block[r, j])))
+    else:
+        # Visit candidates in ascending token-count order: once the size ratio
+        # drops below threshold it only gets worse, so the inner loop can stop.
+        order = sorted(np.flatnonzero(eligible).tolist(), key=lambda idx: arrays[idx].size)
+        for p, i in enumerate(order):
+            la = arrays[i].size
+            for j in order[p + 1:]:
+                if la < threshold * arrays[j].size:
+                    break
+                score = jaccard_arr(arrays[i], arrays[j])
+                if score >= threshold:
+                    hits.append((min(i, j), max(i, j), score))
+
+    clones = [
+        {
+            "a": _clone_side(functions[i]),
+            "b": _clone_side(functions[j]),
+            "score": round(score, 4),
+        }
+        for i, j, score in hits
+    ]
     clones.sort(key=lambda x: -x["score"])
     return clones
 
@@ -122,9 +249,20 @@ server = LanguageServer("ibd-lsp", "v1.0.0")
 # In-memory workspace function registry for clone detection
 _workspace_functions: Dict[str, List[Dict[str, Any]]] = {}
 
+# Stable per-extraction ids so the CodeLens sweep can skip self with one int compare
+_ID_COUNTER = itertools.count()
+
 # Debounce timers
 _debounce_tasks: Dict[str, asyncio.Task] = {}
 
+# Outgoing notifications, coalesced per event-loop tick (latest wins per URI)
+_pending_diag: Dict[str, List[types.Diagnostic]] = {}
+_pending_clones: Dict[str, List[Dict[str, Any]]] = {}
+_flush_task: Optional[asyncio.Task] = None
+
+# Diagnostics published per chunk while a file's analysis is still draining
+_DIAG_BATCH_SIZE = 50
+
 # Config defaults
 _config = {
     "enable_real_time": True,
@@ -132,11 +270,15 @@ _config = {
     "debounce_ms": 500,
 }
 
-# Bug detectors (reusable instances)
-_py_detector = StaticBugDetector()
-_java_detector = JavaStaticBugDetector()
-_js_detector = JSStaticBugDetector()
-_cpp_detector = CppStaticBugDetector()
+# Bug detectors per file type. The Python detector keeps per-run state, and
+# analyses of different files are interleaved on the event loop, so each
+# analysis gets its own instance.
+_DETECTOR_CLASSES = (
+    (".py", StaticBugDetector),
+    (".java", JavaStaticBugDetector),
+    ((".js", ".jsx", ".ts", ".tsx"), JSStaticBugDetector),
+    ((".cpp", ".c", ".h", ".hpp"), CppStaticBugDetector),
+)
 
 
 def _severity_to_lsp(severity: str) -> types.DiagnosticSeverity:
@@ -152,16 +294,11 @@ def _severity_to_lsp(severity: str) -> types.DiagnosticSeverity:
 
 
 def _get_detector(uri: str):
-    """Pick the right detector based on file extension."""
+    """Create a fresh detector for the file's extension."""
     lower = uri.lower()
-    if lower.endswith(".py"):
-        return _py_detector
-    elif lower.endswith(".java"):
-        return _java_detector
-    elif lower.endswith((".js", ".jsx", ".ts", ".tsx")):
-        return _js_detector
-    elif lower.endswith((".cpp", ".c", ".h", ".hpp")):
-        return _cpp_detector
+    for suffixes, detector_cls in _DETECTOR_CLASSES:
+        if lower.endswith(suffixes):
+            return detector_cls()
     return None
 
 
@@ -181,6 +318,8 @@ def _extract_functions_from_source(uri: str, source: str) -> List[Dict[str, Any]
                         "start": f.get("start", 0),
                         "end": f.get("end", 0),
                         "code": f.get("code", ""),
+                        "_id": next(_ID_COUNTER),
+                        "_tok_arr": _token_array(f.get("code", "")),
                     }
                 )
         except Exception as e:
@@ -189,11 +328,41 @@ def _extract_functions_from_source(uri: str, source: str) -> List[Dict[str, Any]
     return functions
 
 
-def _run_analysis(uri: str, source: str) -> List[types.Diagnostic]:
-    """Run bug detection and return LSP diagnostics."""
+def _bug_to_diagnostic(bug: Dict[str, Any]) -> types.Diagnostic:
+    """Convert one detector bug dict into an LSP Diagnostic."""
+    line = max(0, (bug.get("line", 1) or 1) - 1)
+    sev = _severity_to_lsp(bug.get("severity", "info"))
+    msg = bug.get("message", "Unknown issue")
+    category = bug.get("category", "")
+    evidence = bug.get("evidence", "")
+    suggestion = bug.get("suggestion", "")
+
+    detail_parts = []
+    if category:
+        detail_parts.append(f"[{category}]")
+    if evidence:
+        detail_parts.append(evidence)
+    if suggestion:
+        detail_parts.append(f"Fix: {suggestion}")
+    detail = " — ".join(detail_parts)
+
+    return types.Diagnostic(
+        range=types.Range(
+            start=types.Position(line=line, character=0),
+            end=types.Position(line=line, character=999),
+        ),
+        message=f"{msg}\n{detail}" if detail else msg,
+        severity=sev,
+        source="IBD",
+        code=category or None,
+    )
+
+
+def _iter_diagnostics(uri: str, source: str) -> Iterator[types.Diagnostic]:
+    """Run bug detection lazily, yielding LSP diagnostics as bugs are found."""
     detector = _get_detector(uri)
     if detector is None:
-        return []
+        return
 
     # Determine a filepath-like string for the detector
     filepath = uri
@@ -203,42 +372,43 @@ def _run_analysis(uri: str, source: str) -> List[types.Diagnostic]:
         filepath = filepath[7:]
 
     try:
-        bugs = detector.detect_bugs_in_code(source, filepath)
+        for bug in detector.detect_bugs_in_code_iter(source, filepath):
+            yield _bug_to_diagnostic(bug)
     except Exception as e:
         log.error(f"Bug detection error for {uri}: {e}")
-        return []
 
-    diagnostics: List[types.Diagnostic] = []
-    for bug in bugs:
-        line = max(0, (bug.get("line", 1) or 1) - 1)
-        sev = _severity_to_lsp(bug.get("severity", "info"))
-        msg = bug.get("message", "Unknown issue")
-        category = bug.get("category", "")
-        evidence = bug.get("evidence", "")
-        suggestion = bug.get("suggestion", "")
-
-        detail_parts = []
-        if category:
-            detail_parts.append(f"[{category}]")
-        if evidence:
-            detail_parts.append(evidence)
-        if suggestion:
-            detail_parts.append(f"Fix: {suggestion}")
-        detail = " — ".join(detail_parts)
-
-        diag = types.Diagnostic(
-            range=types.Range(
-                start=types.Position(line=line, character=0),
-                end=types.Position(line=line, character=999),
-            ),
-            message=f"{msg}\n{detail}" if detail else msg,
-            severity=sev,
-            source="IBD",
-            code=category or None,
+
+def _run_analysis(uri: str, source: str) -> List[types.Diagnostic]:
+    """Run bug detection and return LSP diagnostics."""
+    return list(_iter_diagnostics(uri, source))
+
+
+async def _flush_pending():
+    """Send every queued diagnostics/clone update in one tight pass."""
+    global _flush_task
+    # Yield once so other analyses finishing in the same tick can queue up
+    await asyncio.sleep(0)
+    _flush_task = None
+
+    diags = dict(_pending_diag)
+    clones = dict(_pending_clones)
+    _pending_diag.clear()
+    _pending_clones.clear()
+
+    for uri, diagnostics in diags.items():
+        server.text_document_publish_diagnostics(
+            types.PublishDiagnosticsParams(uri=uri, diagnostics=diagnostics)
         )
-        diagnostics.append(diag)
+    for uri, clone_list in clones.items():
+        server.send_notification("ibd/cloneResults", {"clones": clone_list, "uri": uri})
+    log.info(f"Flushed {len(diags)} diagnostic and {len(clones)} clone notifications")
 
-    return diagnostics
+
+def _schedule_flush():
+    """Start the flush task on first queued update; later updates piggyback."""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.get_running_loop().create_task(_flush_pending())
 
 
 async def _analyze_and_publish(uri: str, source: str):
@@ -246,15 +416,22 @@ async def _analyze_and_publish(uri: str, source: str):
     if not _config["enable_real_time"]:
         return
 
-    # 1) Static bug detection → diagnostics
-    diagnostics = _run_analysis(uri, source)
-    server.text_document_publish_diagnostics(
-        types.PublishDiagnosticsParams(
-            uri=uri,
-            diagnostics=diagnostics,
-        )
-    )
-    log.info(f"Published {len(diagnostics)} diagnostics for {uri}")
+    # 1) Static bug detection → diagnostics. Publish the first batch right
+    #    away for early feedback, then drain the rest in chunks, yielding the
+    #    loop between them, and republish the merged list.
+    diag_iter = _iter_diagnostics(uri, source)
+    diagnostics = list(islice(diag_iter, _DIAG_BATCH_SIZE))
+    _pending_diag[uri] = diagnostics
+    _schedule_flush()
+    while True:
+        await asyncio.sleep(0)
+        chunk = list(islice(diag_iter, _DIAG_BATCH_SIZE))
+        if not chunk:
+            break
+        diagnostics = diagnostics + chunk
+        _pending_diag[uri] = diagnostics
+        _schedule_flush()
+    log.info(f"Queued {len(diagnostics)} diagnostics for {uri}")
 
     # 2) Extract functions for clone detection
     functions = _extract_functions_from_source(uri, source)
@@ -271,8 +448,9 @@ async def _analyze_and_publish(uri: str, source: str):
         )
         if clones:
             log.info(f"Found {len(clones)} clone pairs in workspace")
-        # Send custom notification to extension
-        server.send_notification("ibd/cloneResults", {"clones": clones, "uri": uri})
+        # Queue custom notification to extension
+        _pending_clones[uri] = clones
+        _schedule_flush()
 
 
 async def _debounced_analyze(uri: str, source: str, delay_ms: int):
@@ -288,7 +466,7 @@ def _schedule_analysis(uri: str, source: str):
     if existing and not existing.done():
         existing.cancel()
 
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     task = loop.create_task(
         _debounced_analyze(uri, source, _config["debounce_ms"])
     )
@@ -367,20 +545,22 @@ def on_did_change(params: types.DidChangeTextDocumentParams):
 
 
 @server.feature(types.TEXT_DOCUMENT_DID_SAVE)
-def on_did_save(params: types.DidSaveTextDocumentParams):
+async def on_did_save(params: types.DidSaveTextDocumentParams):
     """Re-analyze on save (also triggers clone detection refresh)."""
     uri = params.text_document.uri
     source = params.text if params.text else None
     if source is None:
-        # Read from disk if text not included
+        # Read from disk if text not included — off the event loop so a slow
+        # disk/network share doesn't stall the other LSP handlers
         try:
             filepath = uri
             if filepath.startswith("file:///"):
                 filepath = filepath[8:]
             elif filepath.startswith("file://"):
                 filepath = filepath[7:]
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                source = f.read()
+            loop = asyncio.get_running_loop()
+            raw = await loop.run_in_executor(None, Path(filepath).read_bytes)
+            source = raw.decode("utf-8", errors="ignore")
         except Exception:
             return
     _schedule_analysis(uri, source)
@@ -391,10 +571,12 @@ def on_did_close(params: types.DidCloseTextDocumentParams):
     """Clean up when document is closed."""
     uri = params.text_document.uri
     _workspace_functions.pop(uri, None)
-    # Cancel pending analysis
+    # Cancel pending analysis and drop any queued notifications
     existing = _debounce_tasks.pop(uri, None)
     if existing and not existing.done():
         existing.cancel()
+    _pending_diag.pop(uri, None)
+    _pending_clones.pop(uri, None)
     # Clear diagnostics
     server.text_document_publish_diagnostics(
         types.PublishDiagnosticsParams(uri=uri, diagnostics=[])
@@ -421,21 +603,29 @@ def on_code_lens(params: types.CodeLensParams) -> List[types.CodeLens]:
         return lenses
 
     # Find clones for functions in THIS file
+    threshold = _config["clone_threshold"]
     my_functions = _workspace_functions.get(uri, [])
     for func in my_functions:
         code_a = func.get("code", "")
         if not code_a or len(code_a.strip()) < 20:
             continue
+        la = func["_tok_arr"].size
 
         for other in all_functions:
-            if other["file"] == uri and other["name"] == func["name"]:
+            if other["_id"] == func["_id"]:
                 continue  # skip self
             code_b = other.get("code", "")
             if not code_b or len(code_b.strip()) < 20:
                 continue
 
-            score = jaccard_similarity(code_a, code_b)
-            if score >= _config["clone_threshold"]:
+            # Cheap cardinality bound before the intersection
+            lb = other["_tok_arr"].size
+            lo, hi = (la, lb) if la < lb else (lb, la)
+            if lo < threshold * hi:
+                continue
+
+            score = jaccard_arr(func["_tok_arr"], other["_tok_arr"])
+            if score >= threshold:
                 # Get a display-friendly filename
                 other_file = other["file"]
                 if "/" in other_file:
@@ -11,23 +11,45 @@ Usage:
     python main.py --code_folder path/to/code --semantic_threshold 0.75 --enable_bci
 """
 import argparse, json, time, os, logging
-from static_analysis.ast_parser import scan_code_folder
-from static_analysis.ast_parser import scan_code_folder
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import numpy as np
+from static_analysis.ast_parser import scan_code_folder, collect_source_files
 try:
-    from semantic_analysis.llm_embeddings import find_similar_pairs
+    from semantic_analysis.llm_embeddings import find_similar_pairs_batched
 except ImportError:
     print("[!] Warning: sentence-transformers not found or failed to import. Semantic analysis will be disabled.")
-    find_similar_pairs = lambda *args, **kwargs: []
+    find_similar_pairs_batched = lambda *args, **kwargs: []
 except AttributeError:
     print("[!] Warning: sentence-transformers import error. Semantic analysis will be disabled.")
-    find_similar_pairs = lambda *args, **kwargs: []
+    find_similar_pairs_batched = lambda *args, **kwargs: []
 
-from dynamic_testing.rl_tester import scan_folder_dynamic
-from dynamic_testing.rl_tester import scan_folder_dynamic
+from dynamic_testing.rl_tester import scan_paths_dynamic, run_python_file_with_random_inputs
 from classifier.fusion_model import build_snippet_records, structural_similarity, fusion_score
 from bci_tracing.java_trace_collector import scan_java_folder_with_bci
-from bug_detection.detector import detect_bugs
-from visualization.ast_visualizer import generate_ast_diagram
+from bug_detection.detector import detect_bugs, BugDetector
+from visualization.ast_visualizer import generate_ast_diagrams, generate_java_ast_diagram
+
+try:
+    import orjson
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    def _json_encode(obj):
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+        except (orjson.JSONEncodeError, TypeError):
+            # e.g. ints wider than 64 bits, which json.dumps writes exactly
+            return json.dumps(obj, ensure_ascii=False)
+except ImportError:
+    def _json_encode(obj):
+        return json.dumps(obj, ensure_ascii=False)
+
+# On-disk cache for file features / embeddings / similarity pairs / Java BCI traces (disable with --no_cache)
+CACHE_DIR = ".ibd_cache"
+
+# Bug severity sort rank and display marker
+SEVERITY_ORDER = BugDetector.SEVERITY_ORDER
+SEVERITY_MARKER = {"critical": "[!!!]", "high": "[!!]", "medium": "[!]", "low": "[.]", "info": "[i]"}
 
 def setup_logging(verbose=False, debug=False):
     """Setup logging based on verbosity level"""
@@ -45,10 +67,60 @@ def setup_logging(verbose=False, debug=False):
     )
     return logging.getLogger(__name__)
 
-def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=False, bci_jar_path="bci_injector.jar", show_progress=False, file_extensions=None, verbose=False, debug=False, enable_bug_detection=True, enable_visualization=False):
+def _scan_dynamic_one(path, runs):
+    """Process-pool worker: randomized dynamic runs for a single file."""
+    try:
+        return run_python_file_with_random_inputs(path, runs=runs)
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+def _parallel_map(fn, items, jobs, show_progress=False, desc=""):
+    """Map fn over items in a process pool, preserving input order."""
+    with ProcessPoolExecutor(max_workers=jobs) as ex:
+        result_iter = ex.map(fn, items, chunksize=max(1, len(items) // (jobs * 4)))
+        if show_progress:
+            try:
+                from tqdm import tqdm
+                result_iter = tqdm(result_iter, total=len(items), desc=desc, unit="file")
+            except ImportError:
+                pass
+        return list(result_iter)
+
+def stream_json_array(f, items, indent=2, level=0):
+    """Write items as a JSON array, one compact record per line."""
+    pad = " " * (indent * (level + 1))
+    f.write("[")
+    first = True
+    for item in items:
+        f.write(("\n" if first else ",\n") + pad)
+        f.write(_json_encode(item))
+        first = False
+    f.write("]" if first else "\n" + " " * (indent * level) + "]")
+
+def stream_json_object(f, obj, indent=2, level=0):
+    """Write a dict as JSON section by section, streaming any list values."""
+    pad = " " * (indent * (level + 1))
+    f.write("{")
+    first = True
+    for key, value in obj.items():
+        f.write(("\n" if first else ",\n") + pad + _json_encode(key) + ": ")
+        if isinstance(value, dict):
+            stream_json_object(f, value, indent, level + 1)
+        elif isinstance(value, (list, tuple)):
+            stream_json_array(f, value, indent, level + 1)
+        else:
+            f.write(_json_encode(value))
+        first = False
+    f.write("}" if first else "\n" + " " * (indent * level) + "}")
+
+def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=False, bci_jar_path="bci_injector.jar", show_progress=False, file_extensions=None, verbose=False, debug=False, enable_bug_detection=True, enable_visualization=False, jobs=1, use_cache=True):
     logger = setup_logging(verbose=verbose, debug=debug)
+    # Checked once so debug f-strings are never built when they would be dropped
+    dbg = logger.isEnabledFor(logging.DEBUG)
+    if not jobs or jobs < 1:
+        jobs = os.cpu_count() or 1
     
-    if debug:
+    if dbg:
         logger.debug(f"Starting pipeline with parameters: paths={paths}, threshold={semantic_threshold}, dynamic_runs={dynamic_runs}")
     
     if file_extensions:
@@ -56,10 +128,12 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
         logger.info(f"File extension filter: {file_extensions}")
     print("[*] Static analysis...")
     logger.debug("Beginning static analysis phase")
-    static_results = scan_code_folder(paths, show_progress=show_progress, file_extensions=file_extensions)
+    # Pass 1 (map): parse files in parallel when jobs > 1; the pool is torn down
+    # before the dynamic pass so its worker memory is released first
+    static_results = scan_code_folder(paths, show_progress=show_progress, file_extensions=file_extensions, cache_dir=CACHE_DIR if use_cache else None, jobs=jobs)
     print(f"  -> scanned {len(static_results)} files")
     logger.info(f"Static analysis completed: {len(static_results)} files scanned")
-    if debug:
+    if dbg:
         logger.debug(f"Static results: {[r.get('path', 'unknown') for r in static_results[:5]]}")
 
     print("[*] Build snippet records...")
@@ -67,38 +141,25 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     snippet_records = build_snippet_records(static_results)
     print(f"  -> extracted {len(snippet_records)} function/method snippets")
     logger.info(f"Extracted {len(snippet_records)} snippets")
-    if debug:
+    if dbg:
         logger.debug(f"Sample snippets: {[s.get('func_name', 'unknown') for s in snippet_records[:5]]}")
 
     print("[*] Semantic analysis (embedding similarities)...")
     logger.debug("Beginning semantic analysis with embeddings")
-    sem_pairs = find_similar_pairs(snippet_records, threshold=semantic_threshold, show_progress=show_progress)
+    sem_pairs = find_similar_pairs_batched(snippet_records, threshold=semantic_threshold, show_progress=show_progress, cache_dir=CACHE_DIR if use_cache else None)
     print(f"  -> found {len(sem_pairs)} semantic-similar pairs (threshold={semantic_threshold})")
     logger.info(f"Semantic analysis found {len(sem_pairs)} similar pairs")
-    if debug and sem_pairs:
+    if dbg and sem_pairs:
         logger.debug(f"Top semantic pair: {sem_pairs[0].get('a', {}).get('func_name')} <-> {sem_pairs[0].get('b', {}).get('func_name')} (score={sem_pairs[0].get('score', 0):.3f})")
 
     print("[*] Dynamic testing (simple fuzzing)...")
     logger.debug("Beginning dynamic testing phase")
-    # dyn_results = scan_folder_dynamic(code_folder, runs_per_file=dynamic_runs, show_progress=show_progress, file_extensions=file_extensions)
-    # Update to handle list of paths
-    dyn_results = []
-    for p in paths:
-        if os.path.isdir(p):
-            dyn_results.extend(scan_folder_dynamic(p, runs_per_file=dynamic_runs, show_progress=show_progress, file_extensions=file_extensions))
-        elif os.path.isfile(p):
-            # scan_folder_dynamic might expect a folder, but let's see. 
-            # If it expects folder, we might need to handle file case.
-            # For now, let's assume it handles folders. 
-            # Actually, to be safe, let's update rl_tester.py to handle list of paths.
-            # But I can't see rl_tester.py right now.
-            # Let's just pass the list and update rl_tester.py to accept it.
-            pass 
-    
-    # Better approach: Update scan_folder_dynamic to accept list of paths
-    from dynamic_testing.rl_tester import scan_paths_dynamic
-    dyn_results = scan_paths_dynamic(paths, runs_per_file=dynamic_runs, show_progress=show_progress, file_extensions=file_extensions)
-    # Redundant code block removed
+    if jobs > 1:
+        # Pass 2 (map): dynamic runs per file, same extension defaults as scan_paths_dynamic
+        dyn_files = collect_source_files(paths, file_extensions or [".py"])
+        dyn_results = _parallel_map(partial(_scan_dynamic_one, runs=dynamic_runs), dyn_files, jobs, show_progress, "Dynamic testing")
+    else:
+        dyn_results = scan_paths_dynamic(paths, runs_per_file=dynamic_runs, show_progress=show_progress, file_extensions=file_extensions)
 
     anomaly_map = {}
     for r in dyn_results:
@@ -106,17 +167,19 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
         anomalies = r.get("anomalies", [])
         if anomalies:
             anomaly_map[path] = anomalies
-            logger.debug(f"Anomalies found in {path}: {len(anomalies)}")
+            if dbg:
+                logger.debug(f"Anomalies found in {path}: {len(anomalies)}")
     logger.info(f"Dynamic testing completed: {len(dyn_results)} files tested, {len(anomaly_map)} with anomalies")
 
     # BCI execution tracing for Java files
     bci_results = []
     if enable_bci and os.path.exists(bci_jar_path):
         print("[*] BCI execution tracing (Java bytecode instrumentation)...")
-        logger.debug(f"BCI tracing enabled, jar path: {bci_jar_path}")
+        if dbg:
+            logger.debug(f"BCI tracing enabled, jar path: {bci_jar_path}")
         try:
             from bci_tracing.java_trace_collector import scan_paths_with_bci
-            bci_results = scan_paths_with_bci(paths, bci_jar_path)
+            bci_results = scan_paths_with_bci(paths, bci_jar_path, batch_mode=True)
             print(f"  -> BCI traced {len(bci_results)} Java files")
             logger.info(f"BCI tracing completed: {len(bci_results)} files")
             
@@ -124,7 +187,8 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
             for result in bci_results:
                 if result.get("success"):
                     print(f"    ✓ {os.path.basename(result['java_file'])} - Trace: {result.get('trace_file', 'N/A')}")
-                    logger.debug(f"BCI success: {result['java_file']}")
+                    if dbg:
+                        logger.debug(f"BCI success: {result['java_file']}")
                 else:
                     print(f"    ✗ {os.path.basename(result['java_file'])} - Error: {result.get('error', 'Unknown')}")
                     logger.warning(f"BCI failed for {result.get('java_file', 'unknown')}: {result.get('error', 'Unknown')}")
@@ -174,28 +238,39 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     if enable_visualization:
         print("\n[*] Generating AST Execution Diagrams...")
         logger.debug("Beginning visualization phase")
-        count = 0
-        for result in static_results:
-            path = result.get("path")
-            if path and path.endswith(".py"):
-                try:
-                    out = generate_ast_diagram(path)
-                    if out:
-                        count += 1
-                        if verbose:
-                            print(f"  -> Generated diagram: {out}")
-                except Exception as e:
-                    logger.error(f"Failed to visualize {path}: {e}")
-            elif path and path.endswith(".java"):
-                try:
-                    from visualization.ast_visualizer import generate_java_ast_diagram
-                    out = generate_java_ast_diagram(path, bci_jar_path)
-                    if out:
-                        count += 1
-                        if verbose:
-                            print(f"  -> Generated diagram: {out}")
-                except Exception as e:
-                    logger.error(f"Failed to visualize {path}: {e}")
+        java_cache_dir = CACHE_DIR if use_cache else None
+
+        def _visualize_java(path):
+            try:
+                return generate_java_ast_diagram(path, bci_jar_path, cache_dir=java_cache_dir)
+            except Exception as e:
+                logger.error(f"Failed to visualize {path}: {e}")
+                return None
+
+        work_items = [r.get("path") for r in static_results
+                      if r.get("path") and r["path"].endswith((".py", ".java"))]
+        # Python diagrams exec the files under a process-wide tracer, so they stay
+        # on this thread, all in one coverage session; Java diagrams mostly wait
+        # on javac/java subprocesses
+        py_items = [p for p in work_items if p.endswith(".py")]
+        java_items = [p for p in work_items if p.endswith(".java")]
+        try:
+            py_outputs = generate_ast_diagrams(py_items)
+        except Exception as e:
+            logger.error(f"Failed to visualize Python files: {e}")
+            py_outputs = [None] * len(py_items)
+        java_outputs = []
+        if java_items:
+            with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 2)) as ex:
+                java_outputs = list(ex.map(_visualize_java, java_items))
+        # Report diagrams in scan order, not grouped by language
+        py_outputs, java_outputs = iter(py_outputs), iter(java_outputs)
+        outputs = [next(py_outputs if p.endswith(".py") else java_outputs) for p in work_items]
+        outputs = [out for out in outputs if out]
+        count = len(outputs)
+        if verbose:
+            for out in outputs:
+                print(f"  -> Generated diagram: {out}")
         print(f"  -> Generated {count} AST diagrams")
 
     # Fusion: combine for the top semantic pairs
@@ -212,19 +287,39 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     else:
         pair_iter = sem_pairs
     
-    # Import new detailed fusion function
-    from classifier.fusion_model import fusion_score_detailed
+    from classifier.fusion_model import pair_similarity_metrics, fusion_scores_batch, fusion_components, feature_columns, structural_similarity_batch
+    
+    anomalous_files = frozenset(k for k, v in anomaly_map.items() if v)
+    
+    # Structural similarity straight from per-snippet feature columns (pairs index snippet_records)
+    columns = feature_columns(snippet_records)
+    if columns is not None:
+        struct_sims = structural_similarity_batch(columns, [p['i'] for p in sem_pairs], [p['j'] for p in sem_pairs]).tolist()
+    else:
+        struct_sims = []
     
+    # Per-pair similarity metrics, then one vectorized scoring pass
+    sem_scores, dyn_flags, metrics = [], [], []
     for p in pair_iter:
-        logger.debug(f"Processing pair: {p.get('a', {}).get('func_name')} <-> {p.get('b', {}).get('func_name')}")
+        if dbg:
+            logger.debug(f"Processing pair: {p.get('a', {}).get('func_name')} <-> {p.get('b', {}).get('func_name')}")
         a = p['a']; b = p['b']; sem_score = p['score']
-        struct_sim = structural_similarity(a.get('features', {}), b.get('features', {}))
-        dyn_a = bool(anomaly_map.get(a.get('file')))
-        dyn_b = bool(anomaly_map.get(b.get('file')))
-        dyn_flag = dyn_a or dyn_b
-        
-        # Use new detailed scoring
-        total_score, components, explanation = fusion_score_detailed(struct_sim, sem_score, dyn_flag, code_a=a.get('code', ''), code_b=b.get('code', ''))
+        if columns is None:
+            struct_sims.append(structural_similarity(a.get('features', {}), b.get('features', {})))
+        sem_scores.append(sem_score)
+        dyn_flags.append(a.get('file') in anomalous_files or b.get('file') in anomalous_files)
+        metrics.append(pair_similarity_metrics(a.get('code', ''), b.get('code', ''), sem_score))
+    
+    if sem_pairs:
+        fusion_scores = fusion_scores_batch(struct_sims, sem_scores, dyn_flags,
+                                            [m[0] for m in metrics], [m[1] for m in metrics]).tolist()
+    else:
+        fusion_scores = []
+    
+    for p, struct_sim, sem_score, dyn_flag, (line_sim, token_sim, clone_type), total_score in zip(
+            sem_pairs, struct_sims, sem_scores, dyn_flags, metrics, fusion_scores):
+        a = p['a']; b = p['b']
+        components, explanation = fusion_components(struct_sim, sem_score, dyn_flag, line_sim, token_sim, clone_type)
         
         reports.append({
             "a": a, "b": b,
@@ -239,7 +334,7 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     # sort by fusion_score descending
     reports.sort(key=lambda x: -x["fusion_score"])
     logger.info(f"Fusion scoring completed: {len(reports)} reports generated")
-    if debug and reports:
+    if dbg and reports:
         logger.debug(f"Top fusion score: {reports[0].get('fusion_score', 0):.3f}")
     
     # Bug Propagation Logic
@@ -250,25 +345,26 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
         print(f"  -> Found {len(propagated_bugs)} latent bugs via clone propagation")
         bug_results.extend(propagated_bugs)
         # Re-sort bugs
-        bug_results.sort(key=lambda b: (
-            {"critical": 0, "high": 1, "medium": 2, "low": 3, "info": 4}.get(b.get("severity", "info"), 99)
-        ))
+        bug_results.sort(key=lambda b: SEVERITY_ORDER.get(b.get("severity", "info"), 99))
     
-    print("[*] Results (top candidates):")
+    # Build the display text first and emit it with one print per section
+    lines = ["[*] Results (top candidates):"]
     for r in reports[:20]:
         clone_type = r.get("score_components", {}).get("clone_type", "Unknown type")
-        print(f"\n[CLONE MATCH] {r['file_a']} <---> {r['file_b']}")
-        print(f"  -> Type: {clone_type}")
-        print(f"  -> Fusion Score: {r['fusion_score']:.3f} | Struct: {r['struct_sim']:.3f} | Sem: {r['semantic_sim']:.3f}")
+        lines.append(f"\n[CLONE MATCH] {r['file_a']} <---> {r['file_b']}")
+        lines.append(f"  -> Type: {clone_type}")
+        lines.append(f"  -> Fusion Score: {r['fusion_score']:.3f} | Struct: {r['struct_sim']:.3f} | Sem: {r['semantic_sim']:.3f}")
         if r['dynamic_anomaly']:
-            print(f"  -> [!] Dynamic Anomaly Detected")
+            lines.append(f"  -> [!] Dynamic Anomaly Detected")
+    print("\n".join(lines))
 
     # Print dynamic anomalies summary
     if anomaly_map:
-        print("\n[*] Dynamic anomalies found in the following files:")
+        lines = ["\n[*] Dynamic anomalies found in the following files:"]
         for path, anomalies in anomaly_map.items():
-            print(f"- {path}: {len(anomalies)} anomalous runs (sample):")
-            print(json.dumps(anomalies[:2], indent=2))
+            lines.append(f"- {path}: {len(anomalies)} anomalous runs (sample):")
+            lines.append(json.dumps(anomalies[:2], indent=2))
+        print("\n".join(lines))
     else:
         print("\n[*] No dynamic anomalies detected (in prototype runs).")
 
@@ -306,9 +402,11 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     print(f"Files with Dynamic Anomalies: {files_with_anomalies}")
     print(f"Total Dynamic Anomalies: {total_anomalies}")
     
-    # Clone Type Breakdown
+    # Single pass over reports for clone types, fusion and structural stats
     if reports:
         type_counts = {"Type 1": 0, "Type 2": 0, "Type 3": 0, "Type 4": 0, "Other": 0}
+        fusion_sum, struct_sum, high_confidence = 0.0, 0.0, 0
+        max_fusion, min_fusion = float("-inf"), float("inf")
         for r in reports:
             ctype = r.get("score_components", {}).get("clone_type", "")
             if "Type 1" in ctype: type_counts["Type 1"] += 1
@@ -317,6 +415,17 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
             elif "Type 4" in ctype: type_counts["Type 4"] += 1
             else: type_counts["Other"] += 1
             
+            s = r.get('fusion_score', 0)
+            fusion_sum += s
+            if s > max_fusion: max_fusion = s
+            if s < min_fusion: min_fusion = s
+            if s >= 0.7: high_confidence += 1
+            struct_sum += r.get('struct_sim', 0)
+        avg_fusion = fusion_sum / len(reports)
+        avg_struct = struct_sum / len(reports)
+            
+    # Clone Type Breakdown
+    if reports:
         print("\nClone Type Breakdown:")
         print(f"  Type 1 (Exact):          {type_counts['Type 1']}")
         print(f"  Type 2 (Renamed):        {type_counts['Type 2']}")
@@ -336,15 +445,12 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
         print(f"  Average: {avg_similarity:.3f}")
         print(f"  Maximum: {max_similarity:.3f}")
         print(f"  Minimum: {min_similarity:.3f}")
-        print(f"  Median: {sorted(similarities)[len(similarities)//2]:.3f}")
+        # Upper median via O(N) partition rather than a full sort
+        median_similarity = float(np.partition(similarities, len(similarities) // 2)[len(similarities) // 2])
+        print(f"  Median: {median_similarity:.3f}")
     
     # Fusion score statistics
     if reports:
-        fusion_scores = [r.get('fusion_score', 0) for r in reports]
-        avg_fusion = sum(fusion_scores) / len(fusion_scores) if fusion_scores else 0
-        max_fusion = max(fusion_scores) if fusion_scores else 0
-        min_fusion = min(fusion_scores) if fusion_scores else 0
-        high_confidence = sum(1 for s in fusion_scores if s >= 0.7)
         print(f"\nFusion Score Statistics:")
         print(f"  Average: {avg_fusion:.3f}")
         print(f"  Maximum: {max_fusion:.3f}")
@@ -353,8 +459,6 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     
     # Structural similarity statistics
     if reports:
-        struct_sims = [r.get('struct_sim', 0) for r in reports]
-        avg_struct = sum(struct_sims) / len(struct_sims) if struct_sims else 0
         print(f"\nStructural Similarity Statistics:")
         print(f"  Average: {avg_struct:.3f}")
     
@@ -376,11 +480,7 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
     
     # File type breakdown
     if static_results:
-        file_types = {}
-        for r in static_results:
-            path = r.get('path', '')
-            ext = os.path.splitext(path)[1] or 'no_ext'
-            file_types[ext] = file_types.get(ext, 0) + 1
+        file_types = Counter(os.path.splitext(r.get('path', ''))[1] or 'no_ext' for r in static_results)
         if file_types:
             print(f"\nFile Type Breakdown:")
             for ext, count in sorted(file_types.items(), key=lambda x: -x[1]):
@@ -395,7 +495,7 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
             for sev in ["critical", "high", "medium", "low", "info"]:
                 count = severity_counts.get(sev, 0)
                 if count > 0:
-                    marker = {"critical": "[!!!]", "high": "[!!]", "medium": "[!]", "low": "[.]", "info": "[i]"}.get(sev, "")
+                    marker = SEVERITY_MARKER.get(sev, "")
                     print(f"    {marker} {sev.upper()}: {count}")
             
             # Top bug categories
@@ -415,18 +515,15 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
         print("="*60)
         
         # Group bugs by file
-        bugs_by_file = {}
+        bugs_by_file = defaultdict(list)
         for bug in bug_results:
-            filepath = bug.get("file", "unknown")
-            if filepath not in bugs_by_file:
-                bugs_by_file[filepath] = []
-            bugs_by_file[filepath].append(bug)
+            bugs_by_file[bug.get("file", "unknown")].append(bug)
         
         for filepath, file_bugs in bugs_by_file.items():
             print(f"\n[FILE] {filepath} ({len(file_bugs)} bugs)")
             for bug in sorted(file_bugs, key=lambda b: b.get("line", 0)):
                 sev = bug.get("severity", "unknown")
-                marker = {"critical": "[!!!]", "high": "[!!]", "medium": "[!]", "low": "[.]", "info": "[i]"}.get(sev, "[ ]")
+                marker = SEVERITY_MARKER.get(sev, "[ ]")
                 line = bug.get("line", 0)
                 func = bug.get("function", "")
                 func_str = f" in {func}()" if func else ""
@@ -438,7 +535,7 @@ def run_pipeline(paths, semantic_threshold=0.75, dynamic_runs=5, enable_bci=Fals
         
         print("="*60)
 
-    return {"static": static_results, "semantic_pairs": sem_pairs, "dynamic": dyn_results, "bci": bci_results, "reports": reports, "bugs": bug_results, "bug_stats": bug_stats}
+    return {"static": static_results, "snippet_count": len(snippet_records), "semantic_pairs": sem_pairs, "dynamic": dyn_results, "bci": bci_results, "reports": reports, "bugs": bug_results, "bug_stats": bug_stats}
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -456,6 +553,8 @@ if __name__ == "__main__":
     parser.add_argument("--disable_bug_detection", action="store_true", help="Disable bug detection")
     parser.add_argument("--visualize", action="store_true", help="Generate AST execution diagrams for Python files")
     parser.add_argument("--evolution", action="store_true", help="Enable git evolution analysis")
+    parser.add_argument("--no_cache", action="store_true", help="Disable the on-disk feature/embedding/similarity/trace cache (.ibd_cache)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Worker processes for static/dynamic analysis (0 = all CPU cores)")
     args = parser.parse_args()
     
     # Handle bug detection flag
@@ -464,7 +563,7 @@ if __name__ == "__main__":
     start = time.time()
     # CLI passes a single folder string, wrap it in list
     paths = [args.code_folder]
-    results = run_pipeline(paths, semantic_threshold=args.semantic_threshold, dynamic_runs=args.dynamic_runs, enable_bci=args.enable_bci, bci_jar_path=args.bci_jar, show_progress=args.show_progress, file_extensions=args.file_extensions, verbose=args.verbose, debug=args.debug, enable_bug_detection=enable_bugs, enable_visualization=args.visualize)
+    results = run_pipeline(paths, semantic_threshold=args.semantic_threshold, dynamic_runs=args.dynamic_runs, enable_bci=args.enable_bci, bci_jar_path=args.bci_jar, show_progress=args.show_progress, file_extensions=args.file_extensions, verbose=args.verbose, debug=args.debug, enable_bug_detection=enable_bugs, enable_visualization=args.visualize, jobs=args.jobs, use_cache=not args.no_cache)
     
     # Save to JSON if requested
     if args.output_json:
@@ -500,7 +599,7 @@ if __name__ == "__main__":
             },
             "summary_statistics": {
                 "total_files": len(results["static"]),
-                "total_snippets": len(build_snippet_records(results["static"])),
+                "total_snippets": results["snippet_count"],
                 "total_clone_pairs": len(results["semantic_pairs"]),
                 "total_reports": len(results["reports"]),
                 "files_with_anomalies": len([r for r in results["dynamic"] if r.get("anomalies")]),
@@ -539,7 +638,8 @@ if __name__ == "__main__":
                 json_output["evolution"] = {"error": str(e)}
 
         with open(args.output_json, 'w', encoding='utf-8') as f:
-            json.dump(json_output, f, indent=2, ensure_ascii=False)
+            stream_json_object(f, json_output)
+            f.write("\n")
         print(f"\n[*] Results saved to {args.output_json}")
     
     print(f"\nDone in {time.time()-start:.2f}s")
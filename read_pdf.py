@@ -1,22 +1,37 @@
 from pypdf import PdfReader
+from concurrent.futures import ProcessPoolExecutor
 import sys
 import os
 
-filename = "plan.pdf"
-if len(sys.argv) > 1:
-    filename = sys.argv[1]
+# Per-worker reader, opened once by _init_worker
+_reader = None
 
-output_filename = filename + ".txt"
+def _init_worker(filename):
+    global _reader
+    _reader = PdfReader(filename)
 
-try:
-    reader = PdfReader(filename)
-    print(f"Reading {filename}...")
-    with open(output_filename, "w", encoding="utf-8") as f:
-        f.write(f"Number of pages: {len(reader.pages)}\n")
-        for i, page in enumerate(reader.pages):
-            f.write(f"--- Page {i+1} ---\n")
-            text = page.extract_text()
-            f.write(text + "\n")
-    print(f"Successfully wrote to {output_filename}")
-except Exception as e:
-    print(f"Error reading PDF: {e}")
+def _extract_page(idx):
+    return idx, _reader.pages[idx].extract_text()
+
+if __name__ == "__main__":
+    filename = "plan.pdf"
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+
+    output_filename = filename + ".txt"
+
+    try:
+        reader = PdfReader(filename)
+        n_pages = len(reader.pages)
+        print(f"Reading {filename}...")
+        parts = [f"Number of pages: {n_pages}\n"]
+        # Pages are extracted independently, one worker process per core
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_worker, initargs=(filename,)) as ex:
+            chunksize = max(1, n_pages // ((os.cpu_count() or 1) * 4))
+            for i, text in ex.map(_extract_page, range(n_pages), chunksize=chunksize):
+                parts.append(f"--- Page {i+1} ---\n{text}\n")
+        with open(output_filename, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        print(f"Successfully wrote to {output_filename}")
+    except Exception as e:
+        print(f"Error reading PDF: {e}")
@@ -1,19 +1,38 @@
+import math
+
+try:
+    import numpy as np
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# F(92) is the last Fibonacci number that fits in an int64
+INT64_FIB_LIMIT = 92
+
 def calculate_factorial(n):
     if n < 0:
         return None
-    if n == 0:
-        return 1
-    result = 1
-    for i in range(1, n + 1):
-        result *= i
-    return result
+    return math.factorial(n)
+
+if _HAS_NUMBA:
+    @njit(cache=True)
+    def _fibonacci_int64(n):
+        sequence = np.empty(n, dtype=np.int64)
+        sequence[0] = 0
+        if n > 1:
+            sequence[1] = 1
+        for i in range(2, n):
+            sequence[i] = sequence[i - 1] + sequence[i - 2]
+        return sequence
 
 def calculate_fibonacci(n):
     if n <= 0:
         return []
-    if n == 1:
-        return [0]
+    if _HAS_NUMBA and n <= INT64_FIB_LIMIT:
+        return _fibonacci_int64(n).tolist()
+    # Python ints stay exact past the int64 range
     sequence = [0, 1]
     while len(sequence) < n:
         sequence.append(sequence[-1] + sequence[-2])
-    return sequence
+    return sequence[:n]
@@ -1,24 +1,42 @@
+import math
+
+try:
+    import numpy as np
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# Largest count whose last term still fits in an int64
+MAX_INT64_COUNT = 92
+
 def compute_factorial(number):
     # This function computes factorial
     # It is semantically identical to calculate_factorial in math_utils.py
     if number < 0:
         return None
-    if number == 0:
-        return 1
-    res = 1
-    for x in range(1, number + 1):
-        res = res * x
-    return res
+    return math.factorial(number)
+
+if _HAS_NUMBA:
+    @njit(cache=True)
+    def _fib_int64(count):
+        seq = np.empty(count, dtype=np.int64)
+        seq[0] = 0
+        if count > 1:
+            seq[1] = 1
+        for i in range(2, count):
+            seq[i] = seq[i - 1] + seq[i - 2]
+        return seq
 
 def get_fib_sequence(count):
     # This computes fibonacci sequence
     # Semantically similar to calculate_fibonacci
     if count <= 0:
         return []
-    if count == 1:
-        return [0]
+    if _HAS_NUMBA and count <= MAX_INT64_COUNT:
+        return _fib_int64(count).tolist()
+    # big counts: Python ints never overflow
     seq = [0, 1]
     while len(seq) < count:
-        next_val = seq[-1] + seq[-2]
-        seq.append(next_val)
-    return seq
+        seq.append(seq[-1] + seq[-2])
+    return seq[:count]
@@ -3,8 +3,17 @@ Uses sentence-transformers to compute embeddings for code snippets (functions).
 Computes pairwise cosine similarities to find candidate clones.
 """
 import os
+import re
+import json
+import hashlib
+import heapq
+import importlib.util
+import sqlite3
+import threading
+import time
 import numpy as np
 import difflib
+from scipy import sparse
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -13,6 +22,19 @@ except Exception as e:
     print(f"Warning: sentence-transformers not available ({e})")
     SENTENCE_TRANSFORMERS_AVAILABLE = False
 
+# optional: exact inner-product range search for very large snippet sets
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# optional: int8-quantized ONNX Runtime backend (select with IBD_EMBED_BACKEND=onnx).
+# Only probed here: optimum (export + quantization) is heavy to import and only
+# needed once per model, so _OnnxEncoder imports it when the int8 file is missing.
+ONNX_AVAILABLE = all(importlib.util.find_spec(m) is not None
+                     for m in ("onnxruntime", "optimum.onnxruntime", "transformers"))
+
 # Force Jaccard fallback for robustness in this prototype environment
 SKLEARN_AVAILABLE = False
 # try:
@@ -26,24 +48,303 @@ SKLEARN_AVAILABLE = False
 # choose a small model for speed
 _MODEL_NAME = "all-MiniLM-L6-v2"
 
+# "torch" (SentenceTransformer) or "onnx" (quantized ONNX Runtime, if installed)
+EMBED_BACKEND = os.environ.get("IBD_EMBED_BACKEND", "torch").lower()
+_USE_ONNX = EMBED_BACKEND == "onnx" and ONNX_AVAILABLE
+EMBEDDING_MODEL_AVAILABLE = SENTENCE_TRANSFORMERS_AVAILABLE or _USE_ONNX
+
+# cache-key tag: quantized ONNX vectors must not mix with torch ones
+_MODEL_TAG = f"{_MODEL_NAME}-onnx-int8" if _USE_ONNX else _MODEL_NAME
+
+# intra-op threads for model inference; SBERT-sized models stop scaling past
+# ~8. Keep (this x server.py executor workers) within the core count.
+INFERENCE_THREADS = min(os.cpu_count() or 4, 8)
+
 # lazy-loaded model
 _model = None
 
+def _select_device():
+    """Prefer CUDA, then Apple MPS, then CPU."""
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+class _OnnxEncoder:
+    """
+    MiniLM exported to ONNX and dynamically quantized to int8, run with ONNX
+    Runtime: tokenize -> session.run -> mean-pool -> L2-normalize. Exposes the
+    subset of SentenceTransformer.encode used by _encode.
+    """
+    MAX_SEQ_LENGTH = 256
+
+    def __init__(self, model_dir):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        quantized_dir = os.path.join(model_dir, "int8")
+        quantized_path = os.path.join(quantized_dir, "model_quantized.onnx")
+        if not os.path.exists(quantized_path):
+            # one-time export + quantization, reused on later runs
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            exported = ORTModelForFeatureExtraction.from_pretrained(f"sentence-transformers/{_MODEL_NAME}", export=True)
+            exported.save_pretrained(model_dir)
+            AutoTokenizer.from_pretrained(f"sentence-transformers/{_MODEL_NAME}").save_pretrained(quantized_dir)
+            quantizer = ORTQuantizer.from_pretrained(model_dir)
+            quantizer.quantize(save_dir=quantized_dir,
+                               quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+        self.tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = INFERENCE_THREADS
+        self.session = onnxruntime.InferenceSession(quantized_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=False):
+        out = []
+        for start in range(0, len(sentences), batch_size):
+            batch = list(sentences[start:start + batch_size])
+            tok = self.tokenizer(batch, padding=True, truncation=True, max_length=self.MAX_SEQ_LENGTH, return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in tok.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = tok["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if normalize_embeddings:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            out.append(pooled.astype(np.float32))
+        if not out:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(out)
+
+def _set_torch_threads():
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(INFERENCE_THREADS)
+    try:
+        torch.set_num_interop_threads(2)
+    except RuntimeError:
+        # only settable before torch starts any inter-op parallel work
+        pass
+
 def _get_model():
     global _model
-    if _model is None and SENTENCE_TRANSFORMERS_AVAILABLE:
-        _model = SentenceTransformer(_MODEL_NAME)
+    if _model is None and _USE_ONNX:
+        _model = _OnnxEncoder(os.path.join(DEFAULT_CACHE_DIR, "onnx", _MODEL_NAME))
+    elif _model is None and SENTENCE_TRANSFORMERS_AVAILABLE:
+        _set_torch_threads()
+        _model = SentenceTransformer(_MODEL_NAME, device=_select_device())
+        _model.eval()
     return _model
 
-def embed_snippets(snippets, show_progress=False):
+# ---------------------------------------------------------------------------
+# On-disk cache: embeddings keyed by (model, sha256(snippet)), pair lists keyed
+# by the ordered snippet hashes + threshold, so unchanged code isn't re-embedded
+# ---------------------------------------------------------------------------
+DEFAULT_CACHE_DIR = ".ibd_cache"
+
+def _snippet_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+# SQLite limits bound parameters per statement; look keys up in chunks
+_SQLITE_CHUNK = 500
+
+def _embedding_cache_path(cache_dir):
+    # "_norm": entries are L2-normalized, so older unnormalized caches are not reused
+    return os.path.join(cache_dir, f"embeddings_{_MODEL_TAG.replace('/', '_')}_norm.sqlite")
+
+def _open_embedding_cache(cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(_embedding_cache_path(cache_dir))
+    conn.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+    return conn
+
+def _load_embedding_cache(conn, keys):
+    """Fetch only the requested keys: {key: float32 vector}."""
+    found = {}
+    keys = list(keys)
+    for start in range(0, len(keys), _SQLITE_CHUNK):
+        chunk = keys[start:start + _SQLITE_CHUNK]
+        rows = conn.execute(
+            f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(chunk))})", chunk
+        )
+        for key, vec in rows:
+            found[key] = np.frombuffer(vec, dtype=np.float16).astype(np.float32)
+    return found
+
+def _save_embedding_cache(conn, new_entries):
+    # stored as float16: halves cache size; unit-norm cosine inputs tolerate it
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)",
+            ((k, np.asarray(v, dtype=np.float16).tobytes()) for k, v in new_entries.items())
+        )
+
+def _pair_cache_path(cache_dir, method, threshold, hashes):
+    key = _snippet_hash(json.dumps([method, threshold, hashes]))
+    return os.path.join(cache_dir, "pairs", f"{key}.json")
+
+def _load_pair_cache(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _save_pair_cache(path, pairs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([[p["i"], p["j"], p["score"]] for p in pairs], f)
+
+ENCODE_BATCH_SIZE = 64
+
+def _encode(model, snippets, show_progress=False):
+    """
+    Smart batching: encode snippets sorted by length so each batch pads to a
+    similar size, then restore input order. Rows come back L2-normalized.
+    """
+    order = np.argsort([len(s) for s in snippets], kind="stable")
+    emb = model.encode([snippets[i] for i in order], batch_size=ENCODE_BATCH_SIZE,
+                       show_progress_bar=show_progress, convert_to_numpy=True,
+                       normalize_embeddings=True)
+    return emb[np.argsort(order)]
+
+# Micro-batching across threads: concurrent jobs (e.g. the API's worker pool) that embed
+# within the same short window share one model.encode call instead of contending for it
+BATCH_WINDOW_S = 0.02
+
+class _EncodeRequest:
+    __slots__ = ("snippets", "show_progress", "done", "result", "error")
+
+    def __init__(self, snippets, show_progress):
+        self.snippets = snippets
+        self.show_progress = show_progress
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _EncodeBatcher:
+    """
+    Leader/follower batcher around _encode. The first caller with no batch in
+    flight becomes the leader: it encodes everything pending in one call
+    (length-sorted together) and hands each caller its rows by offset. It keeps
+    draining until the queue is empty, so requests that arrive while a batch
+    is encoding share the next call; when other requests are already queued it
+    first waits BATCH_WINDOW_S for more, while a lone caller is encoded at once.
+    Followers just wait for their result. All callers share the process-wide
+    _get_model() instance.
+    """
+    def __init__(self, window=BATCH_WINDOW_S):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = []
+        self._leader_active = False
+
+    def encode(self, model, snippets, show_progress=False):
+        req = _EncodeRequest(list(snippets), show_progress)
+        with self._lock:
+            self._pending.append(req)
+            lead = not self._leader_active
+            self._leader_active = True
+        if lead:
+            self._drain(model)
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _drain(self, model):
+        batch = []
+        finished = False
+        try:
+            while True:
+                with self._lock:
+                    busy = len(self._pending) > 1
+                if busy:
+                    time.sleep(self.window)
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                    if not batch:
+                        self._leader_active = False
+                        finished = True
+                        return
+                texts = [s for req in batch for s in req.snippets]
+                try:
+                    embs = _encode(model, texts, any(req.show_progress for req in batch))
+                except Exception as e:
+                    for req in batch:
+                        req.error = e
+                        req.done.set()
+                    continue
+                offset = 0
+                for req in batch:
+                    req.result = embs[offset:offset + len(req.snippets)]
+                    offset += len(req.snippets)
+                    req.done.set()
+        finally:
+            if not finished:
+                # leaving early (KeyboardInterrupt, ...): hand leadership back and
+                # release every waiter, or later callers would block forever
+                with self._lock:
+                    self._leader_active = False
+                    orphans = [req for req in batch if not req.done.is_set()] + self._pending
+                    self._pending = []
+                for req in orphans:
+                    req.error = RuntimeError("embedding batch aborted")
+                    req.done.set()
+
+_encode_batcher = _EncodeBatcher()
+
+def _embed_with_cache(model, snippets, show_progress, cache_dir):
+    """Embed only snippets whose hash isn't cached yet, in one batched call."""
+    keys = [_snippet_hash(s) for s in snippets]
+    try:
+        conn = _open_embedding_cache(cache_dir)
+    except sqlite3.Error as e:
+        print(f"Warning: embedding cache unavailable ({e})")
+        return _encode_batcher.encode(model, snippets, show_progress)
+    try:
+        try:
+            cache = _load_embedding_cache(conn, set(keys))
+        except sqlite3.Error as e:
+            print(f"Warning: ignoring unreadable embedding cache ({e})")
+            cache = {}
+        missing = {}
+        for k, s in zip(keys, snippets):
+            if k not in cache and k not in missing:
+                missing[k] = s
+        if missing:
+            new_embs = dict(zip(missing.keys(), np.asarray(_encode_batcher.encode(model, list(missing.values()), show_progress), dtype=np.float32)))
+            cache.update(new_embs)
+            try:
+                _save_embedding_cache(conn, new_embs)
+            except sqlite3.Error as e:
+                print(f"Warning: could not update embedding cache ({e})")
+    finally:
+        conn.close()
+    return np.stack([cache[k] for k in keys])
+
+def embed_snippets(snippets, show_progress=False, cache_dir=None):
     """
     snippets: list of strings (code text)
-    returns np.array embeddings (n x d) or None if no embedding method available
+    cache_dir: optional directory for the on-disk embedding cache
+    returns np.array of L2-normalized embeddings (n x d) or None if no embedding method available
     """
-    if SENTENCE_TRANSFORMERS_AVAILABLE:
+    if EMBEDDING_MODEL_AVAILABLE:
         model = _get_model()
-        emb = model.encode(snippets, show_progress_bar=show_progress)
-        return np.array(emb)
+        if cache_dir:
+            return _embed_with_cache(model, snippets, show_progress, cache_dir)
+        return _encode_batcher.encode(model, snippets, show_progress)
     elif SKLEARN_AVAILABLE:
         # Fallback: simple character-level embeddings
         vectorizer = TfidfVectorizer(max_features=1000, ngram_range=(1, 3))
@@ -52,77 +353,420 @@ def embed_snippets(snippets, show_progress=False):
     else:
         return None
 
-def find_similar_pairs(snippet_records, top_k=5, threshold=0.75, show_progress=False):
+def _ranked_pairs(snippet_records, idx_i, idx_j, scores, top_k=None):
+    """
+    Pair dicts ordered by descending score (ties keep i, j order). With top_k,
+    only the best top_k survive a heap selection and get materialized.
+    """
+    if top_k is not None:
+        best = heapq.nlargest(top_k, zip(scores.tolist(), idx_i.tolist(), idx_j.tolist()), key=lambda t: t[0])
+    else:
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        best = zip(scores[order].tolist(), idx_i[order].tolist(), idx_j[order].tolist())
+    return [{"i": i, "j": j, "score": score, "a": snippet_records[i], "b": snippet_records[j]} for score, i, j in best]
+
+def _snippet_texts(snippet_records):
+    return [r["code"] if r.get("code") else f"{r.get('file')}::{r.get('func_name')}" for r in snippet_records]
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def _token_matrix(token_sets):
+    """Binary CSR token-occurrence matrix (rows = snippets, columns = vocabulary)."""
+    vocab = {}
+    indices, indptr = [], [0]
+    for tokens in token_sets:
+        indices.extend(vocab.setdefault(t, len(vocab)) for t in tokens)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(token_sets), max(len(vocab), 1))
+    )
+
+def _sparse_jaccard_pairs(token_sets):
+    """
+    Jaccard similarity for every i<j pair sharing at least one token, via a
+    binary CSR token-occurrence matrix: intersections are one sparse X @ X.T,
+    unions follow from row sizes. Returns (idx_i, idx_j, scores), row-major.
+    """
+    X = _token_matrix(token_sets)
+    sizes = np.diff(X.indptr)
+    inter = sparse.triu(X @ X.T, k=1).tocoo()
+    idx_i, idx_j = inter.row.astype(np.int64), inter.col.astype(np.int64)
+    order = np.lexsort((idx_j, idx_i))
+    idx_i, idx_j, counts = idx_i[order], idx_j[order], inter.data[order]
+    scores = counts / (sizes[idx_i] + sizes[idx_j] - counts)
+    return idx_i, idx_j, scores
+
+def _all_jaccard_pairs(token_sets):
+    """
+    Jaccard similarity for every i<j pair of non-empty token sets, including
+    pairs sharing no token (score 0), for thresholds <= 0. The output is all
+    O(n^2) pairs anyway, so intersections come from a dense X @ X.T.
+    Returns (idx_i, idx_j, scores), row-major.
+    """
+    X = _token_matrix(token_sets)
+    sizes = np.diff(X.indptr)
+    inter = (X @ X.T).toarray()
+    idx_i, idx_j = np.triu_indices(X.shape[0], k=1)
+    nonempty = (sizes[idx_i] > 0) & (sizes[idx_j] > 0)
+    idx_i, idx_j = idx_i[nonempty].astype(np.int64), idx_j[nonempty].astype(np.int64)
+    counts = inter[idx_i, idx_j]
+    scores = counts / (sizes[idx_i] + sizes[idx_j] - counts)
+    return idx_i, idx_j, scores
+
+def _dedup_texts(texts):
+    """Unique texts in first-seen order, plus each text's index into them."""
+    first_seen = {}
+    inverse = np.fromiter((first_seen.setdefault(t, len(first_seen)) for t in texts), dtype=np.int64, count=len(texts))
+    return list(first_seen), inverse
+
+def _expand_duplicate_pairs(inverse, idx_i, idx_j, scores, self_scores):
+    """
+    Map pairs over unique texts back to every original (i, j), i < j: each
+    unique pair expands to all member combinations of its two groups, and each
+    group of identical texts contributes its internal pairs at self_scores[u]
+    (skipped where NaN). Returns (idx_i, idx_j, scores) in row-major order.
+    """
+    counts = np.bincount(inverse)
+    members = np.argsort(inverse, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    reps = counts[idx_i] * counts[idx_j]
+    pair_id = np.repeat(np.arange(len(idx_i)), reps)
+    offset = np.arange(len(pair_id)) - np.repeat(np.cumsum(reps) - reps, reps)
+    width = counts[idx_j][pair_id]
+    a = members[starts[idx_i][pair_id] + offset // width]
+    b = members[starts[idx_j][pair_id] + offset % width]
+    out_i, out_j, out_s = [np.minimum(a, b)], [np.maximum(a, b)], [np.asarray(scores)[pair_id]]
+
+    for u in np.flatnonzero((counts > 1) & ~np.isnan(self_scores)):
+        group = members[starts[u]:starts[u] + counts[u]]
+        gi, gj = np.triu_indices(len(group), k=1)
+        out_i.append(group[gi])
+        out_j.append(group[gj])
+        out_s.append(np.full(len(gi), self_scores[u], dtype=np.asarray(scores).dtype))
+
+    idx_i, idx_j, scores = np.concatenate(out_i), np.concatenate(out_j), np.concatenate(out_s)
+    order = np.lexsort((idx_j, idx_i))
+    return idx_i[order], idx_j[order], scores[order]
+
+def find_similar_pairs(snippet_records, top_k=None, threshold=0.75, show_progress=False, cache_dir=None):
     """
     snippet_records: list of dicts {"file":..., "func_name":..., "code":...}
+    top_k: keep only the top_k highest-scoring pairs (default: all)
+    cache_dir: optional directory for cached embeddings and pair lists
     returns list of pairs (i, j, score) where score >= threshold
     """
     if len(snippet_records) < 2:
         return []
     
-    texts = [r["code"] if r.get("code") else f"{r.get('file')}::{r.get('func_name')}" for r in snippet_records]
-    pairs = []
+    texts = _snippet_texts(snippet_records)
     n = len(texts)
     
-    embs = embed_snippets(texts, show_progress=show_progress)
+    pair_cache_path = None
+    if cache_dir:
+        method = f"cosine:{_MODEL_TAG}" if SKLEARN_AVAILABLE else "jaccard"
+        if top_k is not None:
+            method += f":top{top_k}"
+        pair_cache_path = _pair_cache_path(cache_dir, method, threshold, [_snippet_hash(t) for t in texts])
+        cached = _load_pair_cache(pair_cache_path)
+        if cached is not None:
+            return [{"i": i, "j": j, "score": score, "a": snippet_records[i], "b": snippet_records[j]} for i, j, score in cached]
+    
+    # Identical texts are embedded/tokenized once when features don't depend on the
+    # rest of the corpus (model embeddings, token sets; TF-IDF's IDF does), and pairs
+    # found among the unique texts are expanded back to the original indices
+    inverse = None
+    work_texts = texts
+    if EMBEDDING_MODEL_AVAILABLE or not SKLEARN_AVAILABLE:
+        unique_texts, unique_inverse = _dedup_texts(texts)
+        if len(unique_texts) < n:
+            work_texts, inverse = unique_texts, unique_inverse
+    
+    embs = embed_snippets(work_texts, show_progress=show_progress, cache_dir=cache_dir)
     
     if embs is not None and SKLEARN_AVAILABLE:
-        # Use cosine similarity with embeddings
-        sims = cosine_similarity(embs)
-        
-        # Calculate total pairs for progress bar
-        total_pairs = n * (n - 1) // 2
-        
-        if show_progress:
-            try:
-                from tqdm import tqdm
-                pair_iter = tqdm(range(n), desc="Finding similar pairs", unit="snippet")
-            except ImportError:
-                pair_iter = range(n)
-        else:
-            pair_iter = range(n)
-        
-        for i in pair_iter:
-            for j in range(i+1, n):
-                score = float(sims[i,j])
-                if score >= threshold:
-                    pairs.append({"i": i, "j": j, "score": score,"a": snippet_records[i], "b": snippet_records[j]})
+        # Use cosine similarity with embeddings: rows are already unit length
+        # (normalize_embeddings / TF-IDF l2 norm), so one matmul thresholded
+        # over the upper triangle
+        embs = np.asarray(embs, dtype=np.float32)
+        idx_i, idx_j, scores = _cosine_pairs(embs, threshold)
+        if inverse is not None:
+            self_scores = np.einsum("ij,ij->i", embs, embs)
+            idx_i, idx_j, scores = _expand_duplicate_pairs(inverse, idx_i, idx_j, scores, self_scores)
+            keep = scores >= threshold
+            idx_i, idx_j, scores = idx_i[keep], idx_j[keep], scores[keep]
     else:
         # Fallback: Jaccard Similarity (Token-based)
         # Robust against reordering and minor edits, and works without heavy ML libs.
-        import re
         print("Using Jaccard Similarity fallback for clone detection...")
         
-        # Pre-tokenize all texts
-        token_sets = []
-        for text in texts:
-            # Split by non-word chars and filter empty
-            tokens = set(re.split(r'\W+', text.lower()))
-            tokens.discard('')
-            token_sets.append(tokens)
+        # Pre-tokenize all texts: runs of word chars (same tokens as splitting on \W+)
+        token_sets = [set(_TOKEN_RE.findall(text.lower())) for text in work_texts]
             
-        for i in range(n):
-            for j in range(i+1, n):
-                set_a = token_sets[i]
-                set_b = token_sets[j]
-                
-                if not set_a or not set_b:
-                    continue
-                    
-                intersection = len(set_a.intersection(set_b))
-                union = len(set_a.union(set_b))
-                
-                score = intersection / union if union > 0 else 0.0
-                
-                # Debug print
-                if score > 0.1:
-                    print(f"DEBUG: Pair {i}-{j} score: {score:.4f} ({texts[i][:20]}... vs {texts[j][:20]}...)")
-
-                if score >= threshold:
-                    pairs.append({"i": i, "j": j, "score": score,"a": snippet_records[i], "b": snippet_records[j]})
+        if threshold <= 0:
+            # every non-empty pair qualifies, including ones sharing no token
+            idx_i, idx_j, scores = _all_jaccard_pairs(token_sets)
+        elif len(work_texts) >= MINHASH_MIN_SNIPPETS:
+            idx_i, idx_j, scores = _minhash_jaccard_pairs(token_sets, threshold)
+        else:
+            idx_i, idx_j, scores = _sparse_jaccard_pairs(token_sets)
+        if inverse is not None:
+            # identical non-empty token sets have Jaccard 1; empty ones share no token
+            self_scores = np.array([1.0 if tokens else np.nan for tokens in token_sets])
+            idx_i, idx_j, scores = _expand_duplicate_pairs(inverse, idx_i, idx_j, scores, self_scores)
+        keep = scores >= threshold
+        idx_i, idx_j, scores = idx_i[keep], idx_j[keep], scores[keep]
 
     # sort by descending score
-    pairs.sort(key=lambda x: -x["score"])
+    pairs = _ranked_pairs(snippet_records, idx_i, idx_j, scores, top_k)
+    if pair_cache_path:
+        _save_pair_cache(pair_cache_path, pairs)
+    return pairs
+
+# above this many snippets the N x N similarity matrix is replaced by a FAISS index
+FAISS_MIN_SNIPPETS = 10000
+
+# from this many snippets (without FAISS) candidates come from random-projection LSH
+LSH_MIN_SNIPPETS = 10000
+LSH_BITS = 10
+LSH_TARGET_RECALL = 0.95
+LSH_MAX_TABLES = 64
+
+def _lsh_num_tables(threshold, n_bits=LSH_BITS, target_recall=LSH_TARGET_RECALL):
+    """
+    Tables needed so a pair right at `threshold` collides in at least one table
+    with probability target_recall. A random hyperplane separates two unit
+    vectors with probability angle/pi.
+    """
+    p_bit = 1.0 - np.arccos(np.clip(threshold, -1.0, 1.0)) / np.pi
+    p_table = p_bit ** n_bits
+    if p_table >= 1.0:
+        return 1
+    if p_table <= 0.0:
+        return float("inf")
+    return max(1, int(np.ceil(np.log(1.0 - target_recall) / np.log(1.0 - p_table))))
+
+def _lsh_params(threshold, max_bits=LSH_BITS, target_recall=LSH_TARGET_RECALL):
+    """
+    (n_bits, n_tables) for _lsh_cosine_pairs: the longest sign code, up to
+    max_bits, whose table count for target_recall fits in LSH_MAX_TABLES.
+    Low thresholds get shorter codes (bigger buckets) rather than a capped
+    table count that would silently miss pairs.
+    """
+    for n_bits in range(max_bits, 0, -1):
+        tables = _lsh_num_tables(threshold, n_bits, target_recall)
+        if tables <= LSH_MAX_TABLES:
+            return n_bits, tables
+    return 1, LSH_MAX_TABLES
+
+def _lsh_cosine_pairs(embs, threshold, n_bits, n_tables, seed=0):
+    """
+    Multi-table random-hyperplane LSH for cosine similarity. Each table hashes
+    rows to an n_bits sign code; only rows sharing a bucket are compared, with
+    one small GEMM per bucket. Returns unique (idx_i, idx_j, scores), i < j.
+    """
+    n, d = embs.shape
+    rng = np.random.default_rng(seed)
+    weights = np.uint64(1) << np.arange(n_bits, dtype=np.uint64)
+    found_i, found_j, found_s = [], [], []
+    for _ in range(n_tables):
+        planes = rng.standard_normal((d, n_bits)).astype(np.float32)
+        codes = ((embs @ planes) > 0).astype(np.uint64) @ weights
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        # bucket boundaries in the sorted code array
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        ends = np.r_[starts[1:], n]
+        multi = (ends - starts) > 1
+        for s, e in zip(starts[multi].tolist(), ends[multi].tolist()):
+            members = np.sort(order[s:e])
+            block = embs[members]
+            sims = block @ block.T
+            a, b = np.nonzero(np.triu(sims >= threshold, k=1))
+            if a.size:
+                found_i.append(members[a])
+                found_j.append(members[b])
+                found_s.append(sims[a, b])
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    idx_i = np.concatenate(found_i).astype(np.int64)
+    idx_j = np.concatenate(found_j).astype(np.int64)
+    scores = np.concatenate(found_s)
+    # the same pair may collide in several tables
+    _, first = np.unique(idx_i * n + idx_j, return_index=True)
+    return idx_i[first], idx_j[first], scores[first]
+
+def _cuda_fp16_cosine_pairs(embs, threshold):
+    """
+    All-pairs cosine as half-precision GEMMs on the GPU, one per row tile of
+    _blocked_cosine_pairs; only each tile's hits are copied back. (NumPy has no
+    fp16 BLAS, so the CPU path stays float32.)
+    """
+    import torch
+    x = torch.from_numpy(embs).to("cuda", dtype=torch.float16)
+
+    def tile_hits(i0, i1):
+        block = x[i0:i1] @ x[i0:].T
+        rows, cols = torch.nonzero(block >= threshold, as_tuple=True)
+        return rows.cpu().numpy(), cols.cpu().numpy(), block[rows, cols].float().cpu().numpy()
+
+    return _blocked_cosine_pairs(embs, threshold, tile_hits=tile_hits)
+
+# from this many snippets the Jaccard fallback takes candidates from MinHash LSH
+MINHASH_MIN_SNIPPETS = 10000
+MINHASH_NUM_PERM = 128
+_MINHASH_PRIME = (1 << 31) - 1
+
+def _minhash_bands(threshold, num_perm=MINHASH_NUM_PERM, target_recall=LSH_TARGET_RECALL):
+    """
+    (bands, rows) for LSH banding: the most rows per band (fewest false
+    positives) for which a pair right at `threshold` still becomes a candidate
+    with probability target_recall.
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1.0 - (1.0 - threshold ** rows) ** bands >= target_recall:
+            return bands, rows
+    return num_perm, 1
+
+def _minhash_jaccard_pairs(token_sets, threshold, num_perm=MINHASH_NUM_PERM, seed=0):
+    """
+    MinHash signatures + LSH banding produce candidate pairs; exact Jaccard is
+    computed only for candidates. Returns (idx_i, idx_j, scores), row-major,
+    for candidates with score >= threshold.
+    """
+    X = _token_matrix(token_sets)
+    n = X.shape[0]
+    sizes = np.diff(X.indptr)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MINHASH_PRIME, size=(num_perm, 1), dtype=np.int64)
+    b = rng.integers(0, _MINHASH_PRIME, size=(num_perm, 1), dtype=np.int64)
+
+    # signature[k, row] = min over the row's tokens of (a_k * token + b_k) mod p
+    signatures = np.full((num_perm, n), _MINHASH_PRIME, dtype=np.int64)
+    nonempty = np.flatnonzero(sizes)
+    chunk = 2048
+    for c0 in range(0, nonempty.size, chunk):
+        rows = nonempty[c0:c0 + chunk]
+        starts = X.indptr[rows]
+        cols = np.concatenate([X.indices[X.indptr[r]:X.indptr[r + 1]] for r in rows]).astype(np.int64)
+        hashed = (a * cols[None, :] + b) % _MINHASH_PRIME
+        offsets = np.r_[0, np.cumsum(sizes[rows])[:-1]]
+        signatures[:, rows] = np.minimum.reduceat(hashed, offsets, axis=1)
+
+    bands, rows_per_band = _minhash_bands(threshold, num_perm)
+    found_i, found_j = [], []
+    for band in range(bands):
+        band_sig = np.ascontiguousarray(signatures[band * rows_per_band:(band + 1) * rows_per_band, nonempty].T)
+        keys = band_sig.view(np.dtype((np.void, band_sig.dtype.itemsize * rows_per_band))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], keys.size]
+        for s_, e_ in zip(starts.tolist(), ends.tolist()):
+            if e_ - s_ < 2:
+                continue
+            members = np.sort(nonempty[order[s_:e_]])
+            ii, jj = np.triu_indices(members.size, k=1)
+            found_i.append(members[ii])
+            found_j.append(members[jj])
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64)
+
+    pair_keys = np.unique(np.concatenate(found_i).astype(np.int64) * n + np.concatenate(found_j))
+    idx_i, idx_j = pair_keys // n, pair_keys % n
+    counts = np.asarray(X[idx_i].multiply(X[idx_j]).sum(axis=1)).ravel()
+    scores = counts / (sizes[idx_i] + sizes[idx_j] - counts)
+    keep = scores >= threshold
+    return idx_i[keep], idx_j[keep], scores[keep]
+
+# rows per tile in the dense similarity GEMM: peak memory is B x N, not N x N
+SIM_BLOCK_ROWS = 2048
+
+def _blocked_cosine_pairs(embs, threshold, block_rows=SIM_BLOCK_ROWS, tile_hits=None):
+    """
+    Exact all-pairs cosine in row tiles: each tile multiplies only against the
+    columns at or right of its first row, and keeps hits strictly above the
+    diagonal. tile_hits(i0, i1) -> (rows, cols, scores) scores one tile, with
+    cols relative to i0; the default is a float32 NumPy GEMM. Returns
+    (idx_i, idx_j, scores) in row-major order.
+    """
+    if tile_hits is None:
+        def tile_hits(i0, i1):
+            block = embs[i0:i1] @ embs[i0:].T
+            rows, cols = np.nonzero(block >= threshold)
+            return rows, cols, block[rows, cols]
+
+    n = embs.shape[0]
+    found_i, found_j, found_s = [], [], []
+    for i0 in range(0, n, block_rows):
+        rows, cols, scores = tile_hits(i0, min(i0 + block_rows, n))
+        upper = cols > rows
+        found_i.append(rows[upper] + i0)
+        found_j.append(cols[upper] + i0)
+        found_s.append(scores[upper])
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return (np.concatenate(found_i).astype(np.int64), np.concatenate(found_j).astype(np.int64),
+            np.concatenate(found_s))
+
+def _cosine_pairs(embs, threshold):
+    """
+    All i<j pairs with cosine >= threshold for L2-normalized float32 rows.
+    Returns (idx_i, idx_j, scores) arrays. Exact below LSH_MIN_SNIPPETS (or
+    with FAISS); approximate, LSH-prefiltered, above it.
+    """
+    n = embs.shape[0]
+    if not FAISS_AVAILABLE and n >= LSH_MIN_SNIPPETS:
+        return _lsh_cosine_pairs(embs, threshold, *_lsh_params(threshold))
+    if FAISS_AVAILABLE and n >= FAISS_MIN_SNIPPETS:
+        index = faiss.IndexFlatIP(embs.shape[1])
+        index.add(embs)
+        # range_search is exact: every neighbour with inner product > radius
+        lims, dists, labels = index.range_search(embs, float(np.nextafter(np.float32(threshold), np.float32(-np.inf))))
+        rows = np.repeat(np.arange(n), np.diff(lims).astype(np.int64))
+        keep = labels > rows
+        return rows[keep], labels[keep], dists[keep]
+    if _select_device() == "cuda":
+        return _cuda_fp16_cosine_pairs(embs, threshold)
+    return _blocked_cosine_pairs(embs, threshold)
+
+def find_similar_pairs_batched(snippet_records, threshold=0.75, show_progress=False, cache_dir=None, top_k=None):
+    """
+    Batched variant of find_similar_pairs: embeds all snippets in one call and
+    scores every pair with a single normalized matmul (or FAISS for huge N).
+    Cosine scoring follows the same SKLEARN_AVAILABLE switch as
+    find_similar_pairs, so both return the same pairs; otherwise (and when no
+    embedding model is available) it falls back to find_similar_pairs.
+    """
+    if not (EMBEDDING_MODEL_AVAILABLE and SKLEARN_AVAILABLE) or len(snippet_records) < 2:
+        return find_similar_pairs(snippet_records, top_k=top_k, threshold=threshold, show_progress=show_progress, cache_dir=cache_dir)
+    
+    texts = _snippet_texts(snippet_records)
+    pair_cache_path = None
+    if cache_dir:
+        method = f"gemm:{_MODEL_TAG}" + (f":top{top_k}" if top_k is not None else "")
+        pair_cache_path = _pair_cache_path(cache_dir, method, threshold, [_snippet_hash(t) for t in texts])
+        cached = _load_pair_cache(pair_cache_path)
+        if cached is not None:
+            return [{"i": i, "j": j, "score": score, "a": snippet_records[i], "b": snippet_records[j]} for i, j, score in cached]
+    
+    unique_texts, inverse = _dedup_texts(texts)
+    embs = np.asarray(embed_snippets(unique_texts, show_progress=show_progress, cache_dir=cache_dir), dtype=np.float32)
+    
+    idx_i, idx_j, scores = _cosine_pairs(embs, threshold)
+    if len(unique_texts) < len(texts):
+        self_scores = np.einsum("ij,ij->i", embs, embs)
+        idx_i, idx_j, scores = _expand_duplicate_pairs(inverse, idx_i, idx_j, scores, self_scores)
+        keep = scores >= threshold
+        idx_i, idx_j, scores = idx_i[keep], idx_j[keep], scores[keep]
+    pairs = _ranked_pairs(snippet_records, idx_i, idx_j, scores, top_k)
+    if pair_cache_path:
+        _save_pair_cache(pair_cache_path, pairs)
     return pairs
 
 if __name__ == "__main__":
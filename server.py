@@ -2,19 +2,39 @@ import os
 import asyncio
 import uuid
 import json
+import re
 import time
 from typing import List, Optional, Dict, Any
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from concurrent.futures import ThreadPoolExecutor
 import shutil
 import git
+import numpy as np
 
 # Import the existing pipeline
 from main import run_pipeline
 
-app = FastAPI(title="Intelligent Bug Detection API", version="1.0.0")
+# orjson is optional: much faster encoding of large job results, with NumPy arrays/scalars
+# serialized natively instead of element by element
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+
+    class ORJSONResponse(JSONResponse):
+        def render(self, content: Any) -> bytes:
+            try:
+                return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+            except (orjson.JSONEncodeError, TypeError):
+                # e.g. ints wider than 64 bits: let the stdlib encoder write them exactly
+                return super().render(content)
+except ImportError:
+    _ORJSON_AVAILABLE = False
+    ORJSONResponse = JSONResponse
+
+app = FastAPI(title="Intelligent Bug Detection API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -35,6 +55,9 @@ async def root():
 
 # In-memory job store
 jobs: Dict[str, Dict[str, Any]] = {}
+# Each analysis job may run embedding inference with up to
+# llm_embeddings.INFERENCE_THREADS intra-op threads; raising max_workers
+# multiplies that, so keep workers x threads within the core count.
 executor = ThreadPoolExecutor(max_workers=2)
 
 class AnalyzeRequest(BaseModel):
@@ -186,12 +209,17 @@ async def get_status(job_id: str):
         raise HTTPException(status_code=404, detail="Job not found")
     
     job = jobs[job_id]
-    return JobStatus(
-        job_id=job_id,
-        status=job["status"],
-        result=job.get("result"),
-        error=job.get("error")
-    )
+    status = {
+        "job_id": job_id,
+        "status": job["status"],
+        "result": job.get("result"),
+        "error": job.get("error")
+    }
+    # Completed results can be large: encode them directly rather than validating
+    # and re-encoding the whole nested dict through the response model
+    if _ORJSON_AVAILABLE:
+        return ORJSONResponse(status)
+    return JobStatus(**status)
 
 @app.get("/fs/list")
 async def list_filesystem(path: str = "."):
@@ -201,21 +229,18 @@ async def list_filesystem(path: str = "."):
         if not os.path.exists(abs_path):
             raise HTTPException(status_code=404, detail="Path not found")
         
-        items = []
-        # Parent directory
+        # (not is_dir, lowercase name, name, path, is_dir) tuples sort natively; dicts are built once.
+        # DirEntry.is_dir() answers from scandir's d_type and only stats symlinks (to list linked dirs).
         parent = os.path.dirname(abs_path)
-        items.append({"name": "..", "path": parent, "is_dir": True})
-        
+        entries = [(False, "..", "..", parent, True)]
         with os.scandir(abs_path) as it:
             for entry in it:
-                items.append({
-                    "name": entry.name,
-                    "path": entry.path,
-                    "is_dir": entry.is_dir()
-                })
+                is_dir = entry.is_dir()
+                entries.append((not is_dir, entry.name.lower(), entry.name, entry.path, is_dir))
         
         # Sort: Directories first, then files
-        items.sort(key=lambda x: (not x["is_dir"], x["name"].lower()))
+        entries.sort()
+        items = [{"name": name, "path": entry_path, "is_dir": is_dir} for _, _, name, entry_path, is_dir in entries]
         return {"current_path": abs_path, "items": items}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -261,11 +286,88 @@ async def update_settings(request: SettingsRequest):
     return {"status": "updated"}
 # Response cache for Gemini repairs (avoids duplicate API calls)
 import hashlib
-repair_cache: Dict[str, str] = {}
+from collections import OrderedDict
+REPAIR_CACHE_SIZE = 1024
+
+try:
+    from cachetools import LRUCache
+except ImportError:
+    class LRUCache(OrderedDict):
+        """Minimal stand-in for cachetools.LRUCache when it is not installed."""
+
+        def __init__(self, maxsize: int):
+            super().__init__()
+            self.maxsize = maxsize
+
+        def __getitem__(self, key):
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+        def __setitem__(self, key, value):
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+
+# Bounded so a long-running server doesn't grow without limit on unique bug reports
+repair_cache: Dict[str, str] = LRUCache(maxsize=REPAIR_CACHE_SIZE)
+
+# Cache keys only need to be collision-resistant, not cryptographic: prefer xxh3 when available
+try:
+    import xxhash
+
+    def _repair_cache_key(text: str) -> str:
+        return xxhash.xxh3_128_hexdigest(text.encode())
+except ImportError:
+    def _repair_cache_key(text: str) -> str:
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+# Gemini REST endpoint, called directly on the event loop (no worker threads)
+GEMINI_MODEL = "gemma-3-4b-it"
+GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+GEMINI_RETRY_STATUS = {429, 500, 503}
+GEMINI_MAX_RETRIES = 3
+
+# Shared client: keeps connections (and HTTP/2 if h2 is installed) alive across requests
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(http2=_HTTP2, timeout=httpx.Timeout(120.0, connect=10.0))
+    return _http_client
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    if _http_client is not None:
+        await _http_client.aclose()
+
+async def _gemini_generate(prompt: str, api_key: str) -> str:
+    """Call Gemini generateContent over REST, retrying rate limits with backoff."""
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"temperature": 0.2, "maxOutputTokens": 4096},
+    }
+    client = _get_http_client()
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        r = await client.post(GEMINI_URL, json=payload, headers={"x-goog-api-key": api_key})
+        if r.status_code in GEMINI_RETRY_STATUS and attempt < GEMINI_MAX_RETRIES:
+            await asyncio.sleep(2 ** attempt)
+            continue
+        r.raise_for_status()
+        break
+    parts = r.json()["candidates"][0]["content"]["parts"]
+    return "".join(p.get("text", "") for p in parts)
 
 @app.post("/repair")
 async def suggest_repair(request: RepairRequest):
-    """Use Gemini SDK to generate a real fix for the detected bug."""
+    """Use Gemini to generate a real fix for the detected bug."""
     try:
         # 1. Read the original source file to give Gemini full context
         source_code = ""
@@ -275,18 +377,13 @@ async def suggest_repair(request: RepairRequest):
             source_code = "(Full source not available — analyzing based on bug description)"
 
         # 2. Check cache first — same bug + code = same fix
-        cache_key = hashlib.md5(f"{request.bug_description}:{source_code[:500]}".encode()).hexdigest()
+        cache_key = _repair_cache_key(f"{request.bug_description}:{source_code[:500]}")
         if cache_key in repair_cache:
             print(f"[CACHE HIT] Returning cached repair for: {request.bug_description[:50]}")
             return {"suggestion": repair_cache[cache_key]}
 
-        # 3. Call Gemini via official SDK (handles rate limits automatically)
+        # 3. Call Gemini over REST on the event loop
         if settings["api_key"] and settings["provider"] == "gemini":
-            import google.generativeai as genai
-            
-            genai.configure(api_key=settings["api_key"])
-            model = genai.GenerativeModel("gemma-3-4b-it")
-            
             prompt = f"""You are a senior software engineer. Analyze this bug and provide ONLY the corrected, complete source code.
 
 BUG DESCRIPTION: {request.bug_description}
@@ -300,22 +397,7 @@ INSTRUCTIONS:
 - Keep all other code exactly the same
 - Add a comment "# FIXED:" next to each line you changed
 """
-            # Run in thread pool to avoid blocking the event loop
-            import functools
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                functools.partial(
-                    model.generate_content,
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.2,
-                        max_output_tokens=4096
-                    )
-                )
-            )
-            
-            suggestion = response.text
+            suggestion = await _gemini_generate(prompt, settings["api_key"])
             # Cache the result
             repair_cache[cache_key] = suggestion
             print(f"[CACHE STORE] Cached repair for: {request.bug_description[:50]}")
@@ -402,6 +484,23 @@ async def health_check():
     return {"status": "ok"}
 
 
+# Quick per-line checks for /analyze_file, in reporting order: (name, regex, message, severity, type).
+# All patterns are folded into one alternation so each line is scanned once by the regex engine.
+QUICK_CHECKS = [
+    ("eval", r"eval\(", "Avoid using eval() - Security Risk (use ast.literal_eval instead)", "critical", "Security"),
+    ("exec", r"exec\(", "Avoid using exec() - Code Injection Risk", "critical", "Security"),
+    ("os_system", r"os\.system\(", "Avoid os.system() - Use subprocess instead", "high", "Security"),
+    ("pickle", r"pickle\.loads?\(", "Deserializing untrusted data with pickle is dangerous", "critical", "Security"),
+    ("bare_except", r"^[^\S\n]*except:[^\S\n]*$", "Avoid bare 'except:' clause - catch specific exceptions", "medium", "Best Practice"),
+    ("wildcard_import", r"import \*", "Avoid wildcard imports (import *)", "low", "Best Practice"),
+    ("none_compare", r"[=!]= None", "Use 'is None' / 'is not None' instead of == / !=", "low", "Style"),
+    ("infinite_loop", r"while True:", "Potential infinite loop (no break found)", "high", "Logic"),
+]
+QUICK_CHECK_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern, *_ in QUICK_CHECKS), re.MULTILINE)
+QUICK_CHECK_INDEX = {check[0]: idx for idx, check in enumerate(QUICK_CHECKS)}
+# Line boundaries str.splitlines() recognises besides \n (text-mode reads already fold \r and \r\n)
+_LINE_BREAKS = str.maketrans(dict.fromkeys("\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029", "\n"))
+
 class FileRequest(BaseModel):
     path: str
     content: Optional[str] = None
@@ -429,29 +528,19 @@ async def analyze_single_file(request: FileRequest):
         with open(target_path, 'r', encoding='utf-8', errors='ignore') as f:
             code = f.read()
         
-        # Lightweight static pattern detection (fast for IDE use)
-        lines = code.splitlines()
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            # Security checks
-            if "eval(" in line:
-                issues.append({"line": i+1, "message": "Avoid using eval() - Security Risk (use ast.literal_eval instead)", "severity": "critical", "type": "Security"})
-            if "exec(" in line:
-                issues.append({"line": i+1, "message": "Avoid using exec() - Code Injection Risk", "severity": "critical", "type": "Security"})
-            if "os.system(" in line:
-                issues.append({"line": i+1, "message": "Avoid os.system() - Use subprocess instead", "severity": "high", "type": "Security"})
-            if "pickle.loads(" in line or "pickle.load(" in line:
-                issues.append({"line": i+1, "message": "Deserializing untrusted data with pickle is dangerous", "severity": "critical", "type": "Security"})
-            # Best practice checks
-            if stripped == "except:":
-                issues.append({"line": i+1, "message": "Avoid bare 'except:' clause - catch specific exceptions", "severity": "medium", "type": "Best Practice"})
-            if "import *" in line:
-                issues.append({"line": i+1, "message": "Avoid wildcard imports (import *)", "severity": "low", "type": "Best Practice"})
-            # Common bug patterns
-            if "== None" in line or "!= None" in line:
-                issues.append({"line": i+1, "message": "Use 'is None' / 'is not None' instead of == / !=", "severity": "low", "type": "Style"})
-            if "while True:" in stripped and "break" not in code:
-                issues.append({"line": i+1, "message": "Potential infinite loop (no break found)", "severity": "high", "type": "Logic"})
+        # Lightweight static pattern detection (fast for IDE use): one regex pass over the
+        # whole text, with line numbers recovered from the newline offsets
+        text = code.translate(_LINE_BREAKS)
+        newline_offsets = np.flatnonzero(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32) == 0x0A)
+        matches = [(m.start(), m.lastgroup) for m in QUICK_CHECK_RE.finditer(text)]
+        if matches:
+            has_break = "break" in code
+            line_numbers = np.searchsorted(newline_offsets, [start for start, _ in matches]) + 1
+            hits = {(int(line_no), QUICK_CHECK_INDEX[name]) for line_no, (_, name) in zip(line_numbers, matches)}
+            for line_no, idx in sorted(hits):
+                name, _, message, severity, issue_type = QUICK_CHECKS[idx]
+                if name != "infinite_loop" or not has_break:
+                    issues.append({"line": line_no, "message": message, "severity": severity, "type": issue_type})
             
         return {"issues": issues}
         
@@ -4,7 +4,13 @@ AST-based static feature extractor for Python (and best-effort Java).
 Produces per-file and per-function feature dictionaries.
 """
 import ast
+import copy
+import hashlib
 import os
+import re
+import pickle
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 
 # optional Java parsing
 try:
@@ -13,38 +19,117 @@ try:
 except Exception:
     _HAS_JAVALANG = False
 
+# optional progress bars
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+# Content hashes only spot duplicate files within a scan, so they need not be
+# cryptographic: prefer xxh3 when available
+try:
+    import xxhash
+
+    def _content_digest(data):
+        return xxhash.xxh3_128_digest(data)
+except ImportError:
+    def _content_digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+# ast.get_source_segment's line split: only \r\n, \r and \n end a line (not \f etc.)
+_SOURCE_LINE_RE = re.compile(r"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+\Z")
+_BRANCH_NODES = (ast.If, ast.For, ast.While, ast.Try)
+
+# Per-class counter tags, so each node costs one dict lookup instead of an isinstance chain
+_STMT_TAG, _BRANCH_TAG = 1, 2
+
+def _statement_tags():
+    tags = {}
+    pending = [ast.stmt]
+    while pending:
+        for cls in pending.pop().__subclasses__():
+            tags[cls] = _STMT_TAG | (_BRANCH_TAG if issubclass(cls, _BRANCH_NODES) else 0)
+            pending.append(cls)
+    return tags
+
+_NODE_TAGS = _statement_tags()
+
+def _source_segment(lines, node):
+    """ast.get_source_segment over pre-split lines (offsets are UTF-8 byte columns)."""
+    first, last = node.lineno - 1, node.end_lineno - 1
+    if first == last:
+        return lines[first].encode()[node.col_offset:node.end_col_offset].decode()
+    return "".join([
+        lines[first].encode()[node.col_offset:].decode(),
+        *lines[first + 1:last],
+        lines[last].encode()[:node.end_col_offset].decode(),
+    ])
+
 def extract_python_functions(source_code):
     """
     Returns list of (func_name, start_lineno, end_lineno, code_snippet, features)
     features: dict with simple structural metrics: num_statements, num_branches
     """
     tree = ast.parse(source_code)
-    funcs = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            start = node.lineno - 1
-            # crudely determine end lineno by using body last node lineno
-            end = getattr(node.body[-1], 'lineno', node.lineno) - 1
-            # Extract source line snippet using ast.get_source_segment is best but not always available.
-            snippet = ast.get_source_segment(source_code, node) or ""
-            # structural features
-            num_statements = sum(isinstance(n, ast.stmt) for n in ast.walk(node))
-            num_branches = sum(isinstance(n, (ast.If, ast.For, ast.While, ast.Try)) for n in ast.walk(node))
-            funcs.append({
+    lines = None
+    found = []  # (depth, preorder index, function dict)
+    # One pre-order traversal. totals holds [num_statements, num_branches] for each
+    # FunctionDef currently open (index 0 is the whole module); a finished function's
+    # totals fold into its enclosing scope, so nested code counts for every ancestor.
+    totals = [[0, 0]]
+    node_tags = _NODE_TAGS
+    stack = [(tree, 0, None)]
+    while stack:
+        node, depth, leaving = stack.pop()
+        if leaving is not None:
+            num_statements, num_branches = totals.pop()
+            leaving["features"] = {"num_statements": num_statements, "num_branches": num_branches}
+            totals[-1][0] += num_statements
+            totals[-1][1] += num_branches
+            continue
+        cls = node.__class__
+        if cls is ast.FunctionDef:
+            if lines is None:
+                lines = _SOURCE_LINE_RE.findall(source_code)
+            func = {
                 "name": node.name,
-                "start": start,
-                "end": end,
-                "code": snippet,
-                "features": {"num_statements": num_statements, "num_branches": num_branches}
-            })
+                "start": node.lineno - 1,
+                # crudely determine end lineno by using body last node lineno
+                "end": getattr(node.body[-1], 'lineno', node.lineno) - 1,
+                "code": _source_segment(lines, node),
+                "features": None
+            }
+            found.append((depth, len(found), func))
+            totals.append([1, 0])
+            stack.append((node, depth, func))
+        else:
+            tag = node_tags.get(cls)
+            if tag:
+                counts = totals[-1]
+                counts[0] += 1
+                if tag & _BRANCH_TAG:
+                    counts[1] += 1
+        # inline ast.iter_child_nodes: it dominated the traversal's profile
+        children = []
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if type(value) is list:
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        children.append(item)
+            elif isinstance(value, ast.AST):
+                children.append(value)
+        if children:
+            depth += 1
+            stack.extend([(child, depth, None) for child in reversed(children)])
+    # report functions in ast.walk (breadth-first) order, as before
+    funcs = [func for _, _, func in sorted(found, key=lambda f: f[:2])]
             
     # Fallback for script-style code (no functions)
     if not funcs and source_code.strip():
         # Check if there are any executable statements
-        has_statements = any(isinstance(n, ast.stmt) for n in ast.walk(tree))
-        if has_statements:
-            num_statements = sum(isinstance(n, ast.stmt) for n in ast.walk(tree))
-            num_branches = sum(isinstance(n, (ast.If, ast.For, ast.While, ast.Try)) for n in ast.walk(tree))
+        num_statements, num_branches = totals[0]
+        if num_statements:
             funcs.append({
                 "name": "<module_body>",
                 "start": 0,
@@ -56,6 +141,8 @@ def extract_python_functions(source_code):
     return funcs
 
 def extract_python_file_features(filepath):
+    # A plain read is deliberate: it is well under 1% of ast.parse time, and the
+    # snippets need decoded text anyway, so mmap-ing large files measured no faster.
     with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
         source = f.read()
     funcs = extract_python_functions(source)
@@ -84,20 +171,91 @@ def extract_java_file_features(filepath):
             methods.append({"name": name, "code": snippet, "features": {"num_statements": num_statements, "num_branches": num_branches}})
     return {"path": filepath, "num_methods": len(methods), "methods": methods}
 
-def scan_code_folder(paths, show_progress=False, file_extensions=None):
+# ---------------------------------------------------------------------------
+# On-disk feature cache: per-file feature dicts keyed by (absolute path, mtime_ns,
+# size), so re-scanning an unchanged tree skips reading and parsing entirely
+# ---------------------------------------------------------------------------
+FEATURE_CACHE_FILE = "static_features.sqlite"
+# bump when the extracted features change; Java output also depends on javalang
+_FEATURE_CACHE_TAG = f"v1:javalang={int(_HAS_JAVALANG)}"
+
+def _open_feature_cache(cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, FEATURE_CACHE_FILE), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime INTEGER NOT NULL, "
+        "size INTEGER NOT NULL, tag TEXT NOT NULL, blob BLOB NOT NULL)"
+    )
+    return conn
+
+def _feature_cache_key(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size, _FEATURE_CACHE_TAG)
+
+def _load_cached_features(conn, path):
+    """Cached feature dict for an unchanged file, or None."""
+    try:
+        row = conn.execute(
+            "SELECT blob FROM files WHERE path=? AND mtime=? AND size=? AND tag=?", _feature_cache_key(path)
+        ).fetchone()
+    except (OSError, sqlite3.Error):
+        return None
+    if row is None:
+        return None
+    features = pickle.loads(row[0])
+    features["path"] = path
+    return features
+
+def _store_cached_features(conn, path, features):
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO files (path, mtime, size, tag, blob) VALUES (?, ?, ?, ?, ?)",
+            (*_feature_cache_key(path), pickle.dumps(features, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+    except (OSError, sqlite3.Error):
+        pass
+
+DEFAULT_EXTENSIONS = ['.py', '.java', '.js', '.ts', '.cpp', '.c']
+
+def _walk_source_files(root, suffixes):
     """
-    Walk folders/files and extract features for files matching extensions.
-    Returns list of file feature dicts.
+    Yield files under root whose name ends with one of suffixes, in os.walk order.
+    One scandir per directory: the d_type from the listing answers is_dir() without a stat.
+    """
+    pending = [root]
+    while pending:
+        top = pending.pop()
+        try:
+            with os.scandir(top) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                if entry.name.endswith(suffixes):
+                    yield entry.path
+            # like os.walk(followlinks=False): symlinked directories are not entered
+            elif not entry.is_symlink():
+                subdirs.append(entry.path)
+        pending.extend(reversed(subdirs))
+
+def collect_source_files(paths, file_extensions=None):
+    """
+    Expand files/folders into a flat list of source files matching extensions.
     paths: list of file or directory paths
-    file_extensions: list of extensions to include (e.g., ['.py', '.java']). If None, defaults to ['.py', '.java']
+    file_extensions: list of extensions to include. If None, uses DEFAULT_EXTENSIONS
     """
     if file_extensions is None:
-        file_extensions = ['.py', '.java', '.js', '.ts', '.cpp', '.c']
+        file_extensions = DEFAULT_EXTENSIONS
     # Normalize extensions to start with dot
-    file_extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in file_extensions]
+    suffixes = tuple(ext if ext.startswith('.') else f'.{ext}' for ext in file_extensions)
     
-    results = []
-    # Collect all files first for progress tracking
     all_files = []
     
     # Ensure paths is a list
@@ -107,51 +265,187 @@ def scan_code_folder(paths, show_progress=False, file_extensions=None):
     for path in paths:
         if os.path.isfile(path):
             # Handle single file case
-            if any(path.endswith(ext) for ext in file_extensions):
+            if path.endswith(suffixes):
                 all_files.append(path)
         else:
             # Handle directory case
-            for root, _, files in os.walk(path):
-                for fn in files:
-                    if any(fn.endswith(ext) for ext in file_extensions):
-                        all_files.append(os.path.join(root, fn))
+            all_files.extend(_walk_source_files(path, suffixes))
+    return all_files
+
+# extensions whose features come from a real parse (and are worth caching)
+_PARSED_EXTENSIONS = ('.py', '.java')
+# below this many files to parse, process-pool startup costs more than it saves
+PARALLEL_MIN_FILES = 8
+# below this many files to parse, no progress bar is drawn
+PROGRESS_MIN_FILES = 32
+
+# files ahead of the parser whose reads are already handed to the kernel
+READAHEAD_WINDOW = 64
+
+def _advise_willneed(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _with_readahead(paths, window=READAHEAD_WINDOW):
+    """
+    Yield paths in order while keeping the next `window` of them under
+    POSIX_FADV_WILLNEED, so on a cold cache the disk reads them concurrently
+    while the current file is being parsed. Plain pass-through where posix_fadvise is missing.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        yield from paths
+        return
+    for path in paths[:window]:
+        _advise_willneed(path)
+    for idx, path in enumerate(paths):
+        if idx + window < len(paths):
+            _advise_willneed(paths[idx + window])
+        yield path
+
+def _basic_js_features(path):
+    # Basic support for JS/TS
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return {"path": path, "num_functions": 0, "functions": [], "note": "Basic JS/TS support"}
+
+def _basic_cpp_features(path):
+    # Basic support for C/C++
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return {"path": path, "num_functions": 0, "functions": [], "note": "Basic C/C++ support"}
+
+# feature extractor per file extension
+_FEATURE_HANDLERS = {
+    '.py': extract_python_file_features,
+    '.java': extract_java_file_features,
+    '.js': _basic_js_features, '.jsx': _basic_js_features,
+    '.ts': _basic_js_features, '.tsx': _basic_js_features,
+    '.cpp': _basic_cpp_features, '.c': _basic_cpp_features, '.h': _basic_cpp_features,
+}
+
+def _file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return _content_digest(f.read())
+    except OSError:
+        return None
+
+def _dispatch_one(path):
+    """
+    Feature dict for a single file, chosen by extension (None if unsupported).
+    Module-level so it can run in a process-pool worker.
+    """
+    # slice from the last dot: same match as path.endswith(ext), incl. dotfiles like ".py"
+    handler = _FEATURE_HANDLERS.get(path[path.rfind('.'):])
+    if handler is None:
+        return None
+    try:
+        return handler(path)
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+def scan_code_folder(paths, show_progress=False, file_extensions=None, cache_dir=None, jobs=1):
+    """
+    Walk folders/files and extract features for files matching extensions.
+    Returns list of file feature dicts.
+    paths: list of file or directory paths
+    file_extensions: list of extensions to include (e.g., ['.py', '.java']). If None, uses DEFAULT_EXTENSIONS
+    cache_dir: optional directory for the on-disk feature cache (unchanged files are not re-parsed)
+    jobs: worker processes for parsing (0 or None = all CPU cores); results keep file order
+    """
+    # Collect all files first for progress tracking
+    all_files = collect_source_files(paths, file_extensions)
+    if not jobs or jobs < 1:
+        jobs = os.cpu_count() or 1
     
-    # Use tqdm if available and show_progress is True
-    if show_progress:
+    conn = None
+    if cache_dir:
         try:
-            from tqdm import tqdm
-            file_iter = tqdm(all_files, desc="Scanning files", unit="file")
-        except ImportError:
-            file_iter = all_files
-    else:
-        file_iter = all_files
+            conn = _open_feature_cache(cache_dir)
+        except sqlite3.Error as e:
+            print(f"Warning: feature cache unavailable ({e})")
     
-    for path in file_iter:
-        if path.endswith('.py'):
-            try:
-                results.append(extract_python_file_features(path))
-            except Exception as e:
-                results.append({"path": path, "error": str(e)})
-        elif path.endswith('.java'):
-            try:
-                results.append(extract_java_file_features(path))
-            except Exception as e:
-                results.append({"path": path, "error": str(e)})
-        elif path.endswith('.js') or path.endswith('.jsx') or path.endswith('.ts') or path.endswith('.tsx'):
-            try:
-                # Basic support for JS/TS
-                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                    results.append({"path": path, "num_functions": 0, "functions": [], "note": "Basic JS/TS support"})
-            except Exception as e:
-                results.append({"path": path, "error": str(e)})
-        elif path.endswith('.cpp') or path.endswith('.c') or path.endswith('.h'):
+    try:
+        # Cache hits are served here; only the remaining files are parsed
+        results = [None] * len(all_files)
+        todo = []
+        for idx, path in enumerate(all_files):
+            if conn is not None and path.endswith(_PARSED_EXTENSIONS):
+                results[idx] = _load_cached_features(conn, path)
+            if results[idx] is None:
+                todo.append(idx)
+        
+        # Byte-identical files (vendored copies, stub __init__.py, ...) are parsed once;
+        # the extension is part of the key since it picks the extractor. Only files
+        # whose size matches another one's can be copies, so just those are read and
+        # hashed up front; every other file is read once, by its extractor.
+        same_size = {}
+        for idx in todo:
+            path = all_files[idx]
+            if path.endswith(_PARSED_EXTENSIONS):
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                same_size.setdefault((path[path.rfind('.'):], size), []).append(idx)
+        first_with_content = {}
+        duplicate_of = {}  # index -> index of the first file with the same content
+        for (ext, _), group in same_size.items():
+            if len(group) < 2:
+                continue
+            for idx in group:
+                digest = _file_digest(all_files[idx])
+                if digest is not None:
+                    original = first_with_content.setdefault((ext, digest), idx)
+                    if original != idx:
+                        duplicate_of[idx] = original
+        todo = [idx for idx in todo if idx not in duplicate_of]
+        todo_files = [all_files[idx] for idx in todo]
+        
+        executor = None
+        if jobs > 1 and len(todo_files) >= PARALLEL_MIN_FILES:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            feature_iter = executor.map(_dispatch_one, todo_files, chunksize=max(1, len(todo_files) // (jobs * 4)))
+        else:
+            # executor.map submits everything up front, so readahead only paces the sequential path
+            feature_iter = map(_dispatch_one, _with_readahead(todo_files))
+        # Use tqdm if available and show_progress is True (small scans finish before a bar helps)
+        if show_progress and tqdm is not None and len(todo_files) >= PROGRESS_MIN_FILES:
+            feature_iter = tqdm(feature_iter, total=len(todo_files), desc="Scanning files", unit="file")
+        try:
+            for features, idx in zip(feature_iter, todo):
+                results[idx] = features
+                path = all_files[idx]
+                if conn is not None and features is not None and "error" not in features and path.endswith(_PARSED_EXTENSIONS):
+                    _store_cached_features(conn, path, features)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        # Copies take the first file's features under their own path
+        for idx, original in duplicate_of.items():
+            features = results[original]
+            if features is not None:
+                features = copy.deepcopy(features)
+                features["path"] = all_files[idx]
+                if conn is not None and "error" not in features:
+                    _store_cached_features(conn, all_files[idx], features)
+            results[idx] = features
+    finally:
+        if conn is not None:
+            # cache inserts share one transaction, committed once per scan
             try:
-                # Basic support for C/C++
-                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                    results.append({"path": path, "num_functions": 0, "functions": [], "note": "Basic C/C++ support"})
-            except Exception as e:
-                results.append({"path": path, "error": str(e)})
-    return results
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: could not update feature cache ({e})")
+            conn.close()
+    return [r for r in results if r is not None]
 
 # quick demo function to run when module is executed directly
 if __name__ == "__main__":
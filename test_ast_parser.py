@@ -0,0 +1,129 @@
+"""
+Test script for the static feature extractor
+Checks the single-pass extractor and the scan-level shortcuts against plain per-file parsing
+"""
+import ast
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+# Add current directory to path
+sys.path.append('.')
+
+from static_analysis.ast_parser import extract_python_functions, scan_code_folder, _dispatch_one
+
+def _reference_extract_python_functions(source_code):
+    """The original ast.walk-based extractor"""
+    tree = ast.parse(source_code)
+    funcs = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            funcs.append({
+                "name": node.name,
+                "start": node.lineno - 1,
+                "end": getattr(node.body[-1], 'lineno', node.lineno) - 1,
+                "code": ast.get_source_segment(source_code, node) or "",
+                "features": {
+                    "num_statements": sum(isinstance(n, ast.stmt) for n in ast.walk(node)),
+                    "num_branches": sum(isinstance(n, (ast.If, ast.For, ast.While, ast.Try)) for n in ast.walk(node)),
+                },
+            })
+    if not funcs and source_code.strip() and any(isinstance(n, ast.stmt) for n in ast.walk(tree)):
+        funcs.append({
+            "name": "<module_body>",
+            "start": 0,
+            "end": len(source_code.splitlines()),
+            "code": source_code,
+            "features": {
+                "num_statements": sum(isinstance(n, ast.stmt) for n in ast.walk(tree)),
+                "num_branches": sum(isinstance(n, (ast.If, ast.For, ast.While, ast.Try)) for n in ast.walk(tree)),
+            },
+        })
+    return funcs
+
+EDGE_CASES = [
+    "",
+    "   \n\n",
+    "# only a comment\n",
+    "x = 1\nif x:\n    y = 2\nelse:\n    for i in range(3):\n        pass\n",
+    "def outer():\n    def inner():\n        while True:\n            break\n    class C:\n        def m(self):\n            try:\n                pass\n            except Exception:\n                pass\n    return inner\n",
+    "async def a():\n    def b():\n        if 1: return 2\n    return b\n",
+    "@decorator\ndef f(x=lambda y: y):\n    return [i for i in x if i]\n",
+    "def f():\r\n    s = '''multi\r\nline'''\r\n    return s\r\n",
+    "def f():\n    s = 'é ü 中文 🙂'\n    return s\n\x0cdef g(): return f()\n",
+    "def f(): pass\ndef f(): return 1\n",
+    "match x:\n    case 1:\n        def f(): pass\n    case _:\n        pass\n",
+    "def f():\n\tif a:\n\t\treturn 1\n\ttry:\n\t\tpass\n\tfinally:\n\t\tpass\n",
+]
+
+def test_extract_python_functions_parity():
+    """Single-pass extractor returns exactly what the ast.walk-based original did"""
+    sources = list(EDGE_CASES)
+    for path in sorted(glob.glob("**/*.py", recursive=True)):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            sources.append(f.read())
+    checked = 0
+    for source in sources:
+        try:
+            expected = _reference_extract_python_functions(source)
+        except SyntaxError:
+            continue
+        got = extract_python_functions(source)
+        assert got == expected, f"extractor differs on:\n{source[:200]!r}"
+        checked += 1
+    print(f"✅ extract_python_functions == original on {checked} sources")
+
+def test_scan_duplicate_files():
+    """Byte-identical files each get the features plain parsing gives them, under their own path"""
+    with tempfile.TemporaryDirectory() as root:
+        shutil.copy("samples/math_utils.py", os.path.join(root, "a.py"))
+        os.makedirs(os.path.join(root, "vendor"))
+        shutil.copy("samples/math_utils.py", os.path.join(root, "vendor", "a_copy.py"))
+        shutil.copy("samples/math_utils_clone.py", os.path.join(root, "b.py"))
+        # same bytes, other extension: parsed by the Java extractor, not copied from a.py
+        shutil.copy("samples/math_utils.py", os.path.join(root, "A.java"))
+        shutil.copy("samples/buggy.js", os.path.join(root, "x.js"))
+        shutil.copy("samples/buggy.js", os.path.join(root, "y.js"))
+        for name in ("broken.py", "broken_copy.py"):
+            with open(os.path.join(root, name), 'w') as f:
+                f.write("def f(:\n")
+
+        results = scan_code_folder(root)
+        by_path = {r["path"]: r for r in results}
+        assert len(by_path) == len(results) == 8, f"expected 8 distinct paths, got {[r['path'] for r in results]}"
+        for path, features in by_path.items():
+            assert features == _dispatch_one(path), f"{path}: features differ from parsing the file itself"
+        copy_of = by_path[os.path.join(root, "vendor", "a_copy.py")]
+        assert copy_of["functions"] is not by_path[os.path.join(root, "a.py")]["functions"], "copy shares objects with the original"
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            assert scan_code_folder(root, cache_dir=cache_dir) == results, "cold-cache scan differs"
+            assert scan_code_folder(root, cache_dir=cache_dir) == results, "warm-cache scan differs"
+    print(f"✅ scan_code_folder: {len(results)} files incl. duplicates match per-file parsing, with and without cache")
+
+def main():
+    print("Testing static feature extraction...")
+    print("=" * 50)
+
+    tests = [
+        ("Extractor Parity", test_extract_python_functions_parity),
+        ("Duplicate Files", test_scan_duplicate_files),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {e}")
+
+    print("\n" + "=" * 50)
+    print(f"Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
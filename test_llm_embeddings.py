@@ -0,0 +1,271 @@
+"""
+Test script for the embedding / similarity backends
+Checks the fast paths against the reference computation they replace
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+import numpy as np
+
+# Add current directory to path
+sys.path.append('.')
+
+from semantic_analysis import llm_embeddings as emb
+
+SNIPPETS = [
+    "def add(a, b):\n    return a + b",
+    "def sum_two(x, y):\n    return x + y",
+    "def read_file(path):\n    with open(path) as f:\n        return f.read()",
+    "def load(p):\n    f = open(p)\n    data = f.read()\n    f.close()\n    return data",
+    "public int max(int a, int b) { return a > b ? a : b; }",
+    "function fetchUser(id) { return fetch('/api/users/' + id).then(r => r.json()); }",
+    "for (int i = 0; i < n; i++) { total += values[i]; }",
+    "class Stack:\n    def __init__(self):\n        self.items = []\n    def push(self, x):\n        self.items.append(x)",
+]
+
+def _clone_corpus(seed=0, groups=30, variants=4):
+    """Snippet records in near-clone groups, plus exact copies and token-less records"""
+    rng = np.random.default_rng(seed)
+    vocab = [f"tok{k}" for k in range(40)] + ["if", "return", "for", "self", "x", "y"]
+    records = []
+    for g in range(groups):
+        base = list(rng.choice(vocab, size=12))
+        for v in range(variants):
+            code = list(base)
+            for _ in range(rng.integers(0, 4)):
+                code[rng.integers(len(code))] = rng.choice(vocab)
+            records.append({"file": f"f{g}.py", "func_name": f"fn{g}_{v}", "code": " ".join(code) + "()"})
+    records += [dict(records[k], func_name=f"copy{k}") for k in (0, 5, 5, 17)]
+    records.append({"file": "empty.py", "func_name": "stub", "code": ""})
+    records.append({"file": "punct.py", "func_name": "ops", "code": "() + - * ;"})
+    return records
+
+def _reference_jaccard_pairs(records, threshold):
+    """The original O(n^2) token-set Jaccard loop, as (i, j, score) in ranked order"""
+    texts = [r["code"] if r.get("code") else f"{r.get('file')}::{r.get('func_name')}" for r in records]
+    token_sets = []
+    for text in texts:
+        tokens = set(re.split(r'\W+', text.lower()))
+        tokens.discard('')
+        token_sets.append(tokens)
+    pairs = []
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            set_a, set_b = token_sets[i], token_sets[j]
+            if not set_a or not set_b:
+                continue
+            score = len(set_a & set_b) / len(set_a | set_b)
+            if score >= threshold:
+                pairs.append((i, j, score))
+    pairs.sort(key=lambda p: -p[2])
+    return pairs
+
+def _triples(pairs):
+    return [(p["i"], p["j"], p["score"]) for p in pairs]
+
+class _HashingEncoder:
+    """Deterministic stand-in for the sentence encoder: a hashed bag of tokens"""
+    DIM = 64
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=False):
+        self.calls += 1
+        out = np.zeros((len(sentences), self.DIM), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            for tok in re.findall(r"\w+", text.lower()):
+                out[row, zlib.crc32(tok.encode()) % self.DIM] += 1.0
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+def _check_cosine_pairs(got, embs, threshold, tol):
+    """got matches brute-force pairwise dot products, up to tol around the threshold"""
+    n = embs.shape[0]
+    ref = {(i, j): float(np.dot(embs[i], embs[j])) for i in range(n) for j in range(i + 1, n)}
+    got_scores = {(i, j): s for i, j, s in got}
+    must = {k for k, s in ref.items() if s >= threshold + tol}
+    may = {k for k, s in ref.items() if s >= threshold - tol}
+    assert must <= got_scores.keys() <= may, f"pair set differs: {len(must - got_scores.keys())} missing, {len(got_scores.keys() - may)} extra"
+    worst = max((abs(s - ref[k]) for k, s in got_scores.items()), default=0.0)
+    assert worst <= tol, f"score off by {worst:.2e}"
+    scores = [s for _, _, s in got]
+    assert all(a >= b for a, b in zip(scores, scores[1:])), "pairs not ranked by score"
+    return len(must)
+
+def test_jaccard_matches_brute_force():
+    """Sparse Jaccard with duplicate folding returns exactly the original loop's pairs"""
+    records = _clone_corpus()
+    for threshold in (-1.0, 0.0, 0.3, 0.6, 0.75, 1.0):
+        got = _triples(emb.find_similar_pairs(records, threshold=threshold))
+        ref = _reference_jaccard_pairs(records, threshold)
+        assert got == ref, f"threshold {threshold}: {len(got)} pairs vs {len(ref)} from brute force"
+    print(f"✅ Sparse Jaccard == brute force over {len(records)} snippets (incl. duplicates, empty token sets)")
+
+def test_minhash_jaccard_recall():
+    """MinHash candidates carry exact scores and keep >= 95% of the pairs above threshold"""
+    records = _clone_corpus(seed=1, groups=60)
+    saved = emb.MINHASH_MIN_SNIPPETS
+    emb.MINHASH_MIN_SNIPPETS = 0
+    try:
+        got = _triples(emb.find_similar_pairs(records, threshold=0.6))
+    finally:
+        emb.MINHASH_MIN_SNIPPETS = saved
+    ref = {(i, j): s for i, j, s in _reference_jaccard_pairs(records, 0.6)}
+    assert all(ref.get((i, j)) == s for i, j, s in got), "MinHash returned a pair or score brute force does not"
+    recall = len(got) / len(ref)
+    assert recall >= emb.LSH_TARGET_RECALL, f"MinHash recall {recall:.3f}"
+    print(f"✅ MinHash LSH: recall {recall:.3f} over {len(ref)} pairs, all scores exact")
+
+def test_batched_cosine_matches_brute_force():
+    """find_similar_pairs_batched (dedup, GEMM, top_k, pair + embedding caches) vs per-pair dot products"""
+    records = _clone_corpus(seed=2)
+    texts = emb._snippet_texts(records)
+    encoder = _HashingEncoder()
+    embs = encoder.encode(texts, normalize_embeddings=True)
+    saved = emb.EMBEDDING_MODEL_AVAILABLE, emb.SKLEARN_AVAILABLE, emb._model
+    emb.EMBEDDING_MODEL_AVAILABLE, emb.SKLEARN_AVAILABLE, emb._model = True, True, encoder
+    try:
+        full = _triples(emb.find_similar_pairs_batched(records, threshold=0.6))
+        checked = _check_cosine_pairs(full, embs, 0.6, 1e-5)
+
+        top = _triples(emb.find_similar_pairs_batched(records, threshold=0.6, top_k=7))
+        assert top == full[:7], "top_k is not the head of the full ranking"
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = _triples(emb.find_similar_pairs_batched(records, threshold=0.6, cache_dir=cache_dir))
+            assert first == full, "cold cache run differs from the uncached run"
+            calls = encoder.calls
+            again = _triples(emb.find_similar_pairs_batched(records, threshold=0.6, cache_dir=cache_dir))
+            assert again == full, "pair cache hit differs from the computed pairs"
+            # new threshold: pairs recomputed from the float16 embedding cache
+            lower = _triples(emb.find_similar_pairs_batched(records, threshold=0.5, cache_dir=cache_dir))
+            assert encoder.calls == calls, "cached snippets were encoded again"
+            _check_cosine_pairs(lower, embs, 0.5, 5e-3)
+    finally:
+        emb.EMBEDDING_MODEL_AVAILABLE, emb.SKLEARN_AVAILABLE, emb._model = saved
+    print(f"✅ Batched cosine == brute force ({checked} pairs), top_k and both caches consistent")
+
+def test_batched_defaults_to_jaccard():
+    """With an embedding model but the Jaccard switch on, both entry points return the same pairs"""
+    records = _clone_corpus(seed=3)
+    saved = emb.EMBEDDING_MODEL_AVAILABLE, emb._model
+    emb.EMBEDDING_MODEL_AVAILABLE, emb._model = True, _HashingEncoder()
+    try:
+        batched = _triples(emb.find_similar_pairs_batched(records, threshold=0.6))
+        plain = _triples(emb.find_similar_pairs(records, threshold=0.6))
+    finally:
+        emb.EMBEDDING_MODEL_AVAILABLE, emb._model = saved
+    assert batched == plain == _reference_jaccard_pairs(records, 0.6), "batched path left the Jaccard default"
+    print(f"✅ find_similar_pairs_batched keeps Jaccard scoring by default ({len(plain)} pairs)")
+
+def test_lsh_cosine_recall():
+    """Random-hyperplane LSH keeps >= 95% of the pairs above threshold, with exact scores"""
+    rng = np.random.default_rng(0)
+    embs = rng.standard_normal((3000, 16)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    for threshold in (0.5, 0.75):
+        ref_i, ref_j, ref_s = emb._blocked_cosine_pairs(embs, threshold)
+        ref = dict(zip(zip(ref_i.tolist(), ref_j.tolist()), ref_s.tolist()))
+        got_i, got_j, got_s = emb._lsh_cosine_pairs(embs, threshold, *emb._lsh_params(threshold))
+        got = dict(zip(zip(got_i.tolist(), got_j.tolist()), got_s.tolist()))
+        assert got.keys() <= ref.keys(), "LSH returned a pair below threshold"
+        assert all(abs(s - ref[k]) <= 1e-5 for k, s in got.items()), "LSH score differs from exact cosine"
+        recall = len(got) / len(ref)
+        assert recall >= emb.LSH_TARGET_RECALL, f"threshold {threshold}: LSH recall {recall:.3f}"
+        print(f"✅ Cosine LSH at {threshold}: recall {recall:.3f} over {len(ref)} pairs")
+
+class _InterruptedEncoder:
+    """Raises KeyboardInterrupt on its first call, after letting a follower queue up"""
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.interrupted = False
+        self.follower_error = None
+
+    def _follow(self):
+        try:
+            self.batcher.encode(self, ["queued behind the leader"])
+        except RuntimeError as e:
+            self.follower_error = e
+
+    def encode(self, sentences, **kwargs):
+        if not self.interrupted:
+            self.interrupted = True
+            self.follower = threading.Thread(target=self._follow, daemon=True)
+            self.follower.start()
+            while not self.batcher._pending:
+                time.sleep(0.001)
+            raise KeyboardInterrupt
+        return np.ones((len(sentences), 4), dtype=np.float32)
+
+def test_encode_batcher_recovers_from_interrupt():
+    """An interrupted leader releases queued followers, and the batcher keeps working"""
+    batcher = emb._EncodeBatcher(window=0.5)
+    model = _InterruptedEncoder(batcher)
+    try:
+        batcher.encode(model, ["leader"])
+        raise AssertionError("KeyboardInterrupt was swallowed")
+    except KeyboardInterrupt:
+        pass
+    model.follower.join(timeout=5)
+    assert not model.follower.is_alive(), "follower still blocked after the leader was interrupted"
+    assert model.follower_error is not None, "follower was not told its batch was aborted"
+    start = time.perf_counter()
+    out = batcher.encode(model, ["a", "b"])
+    assert out.shape == (2, 4), "batcher unusable after an interrupt"
+    # a lone caller has nobody to wait for, so it skips the batching window
+    assert time.perf_counter() - start < batcher.window, "lone caller waited for the batching window"
+    print("✅ Encode batcher: interrupt releases followers, lone callers skip the window")
+
+def test_onnx_int8_agrees_with_torch():
+    """int8 ONNX embeddings stay close in cosine to the SentenceTransformer ones"""
+    if not (emb.ONNX_AVAILABLE and emb.SENTENCE_TRANSFORMERS_AVAILABLE):
+        print("⚠️  Skipped: needs onnxruntime, optimum, transformers and sentence-transformers")
+        return
+    onnx_model = emb._OnnxEncoder(os.path.join(emb.DEFAULT_CACHE_DIR, "onnx", emb._MODEL_NAME))
+    torch_model = emb.SentenceTransformer(emb._MODEL_NAME, device="cpu")
+    a = onnx_model.encode(SNIPPETS, normalize_embeddings=True)
+    b = torch_model.encode(SNIPPETS, convert_to_numpy=True, normalize_embeddings=True)
+    assert a.shape == b.shape, f"shape mismatch: {a.shape} vs {b.shape}"
+    # same snippet, two backends
+    agreement = np.sum(a * b, axis=1)
+    assert agreement.min() >= 0.98, f"per-snippet cosine too low: {agreement.min():.4f}"
+    # the clone scores built on top of them
+    drift = np.abs(a @ a.T - b @ b.T).max()
+    assert drift <= 0.03, f"pairwise cosine drift too high: {drift:.4f}"
+    print(f"✅ ONNX int8 vs torch: min cosine {agreement.min():.4f}, max pair drift {drift:.4f}")
+
+def main():
+    print("Testing embedding backends...")
+    print("=" * 50)
+
+    tests = [
+        ("Sparse Jaccard", test_jaccard_matches_brute_force),
+        ("MinHash Jaccard", test_minhash_jaccard_recall),
+        ("Batched Cosine", test_batched_cosine_matches_brute_force),
+        ("Jaccard Default", test_batched_defaults_to_jaccard),
+        ("Cosine LSH", test_lsh_cosine_recall),
+        ("Encode Batcher", test_encode_batcher_recovers_from_interrupt),
+        ("ONNX int8 Agreement", test_onnx_int8_agrees_with_torch),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {e}")
+
+    print("\n" + "=" * 50)
+    print(f"Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
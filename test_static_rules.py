@@ -0,0 +1,81 @@
+"""
+Test script for the static bug detectors
+Checks that lazily consumed detector runs keep their results on the detector
+"""
+import sys
+
+# Add current directory to path
+sys.path.append('.')
+
+from bug_detection.static_rules import (
+    StaticBugDetector, JavaStaticBugDetector, JSStaticBugDetector, CppStaticBugDetector
+)
+
+CASES = [
+    (StaticBugDetector, "def f(a):\n    x == None\n    try:\n        pass\n    except:\n        pass\n" * 30),
+    (JavaStaticBugDetector, "class A { void m() { try {} catch (Exception e) {} e.printStackTrace(); } }\n" * 30),
+    (JSStaticBugDetector, "var x = 1; console.log(x); eval(x);\n" * 30),
+    (CppStaticBugDetector, "int main() { gets(b); strcpy(a, b); system(c); }\n" * 30),
+]
+
+def test_interleaved_iterators():
+    """Generators on separate detectors, advanced in turn, must not mix bugs or files"""
+    for detector_cls, code in CASES:
+        expected_a = detector_cls().detect_bugs_in_code(code, "A.src")
+        expected_b = detector_cls().detect_bugs_in_code(code, "B.src")
+        iter_a = detector_cls().detect_bugs_in_code_iter(code, "A.src")
+        iter_b = detector_cls().detect_bugs_in_code_iter(code, "B.src")
+        got_a, got_b = [], []
+        for bug_a, bug_b in zip(iter_a, iter_b):
+            got_a.append(bug_a)
+            got_b.append(bug_b)
+        got_a.extend(iter_a)
+        got_b.extend(iter_b)
+        assert got_a == expected_a, f"{detector_cls.__name__}: run A changed by interleaving"
+        assert got_b == expected_b, f"{detector_cls.__name__}: run B changed by interleaving"
+        assert all(bug["file"] == "A.src" for bug in got_a), f"{detector_cls.__name__}: bug attributed to wrong file"
+        print(f"✅ {detector_cls.__name__}: {len(got_a)} bugs per run, interleaving-safe")
+
+class _ConfiguredDetector(StaticBugDetector):
+    """A subclass whose constructor takes arguments"""
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+
+def test_iterator_keeps_detector_state():
+    """The generator fills self.bugs, resets it per call and works for subclasses"""
+    code = CASES[0][1]
+    detector = _ConfiguredDetector("custom")
+    first = list(detector.detect_bugs_in_code_iter(code, "A.src"))
+    assert first and detector.bugs == first, "detector.bugs does not hold the yielded bugs"
+    assert detector.current_file == "A.src", "current_file not set by the generator"
+
+    second = list(detector.detect_bugs_in_code_iter("def g():\n    return 1\n", "B.src"))
+    assert detector.bugs == second, "detector.bugs not reset by the next call"
+    assert detector.detect_bugs_in_code(code, "A.src") == first, "detect_bugs_in_code differs from the generator"
+    print(f"✅ detector.bugs tracks each run ({len(first)} then {len(second)} bugs), subclass constructors untouched")
+
+def main():
+    print("Testing static bug detectors...")
+    print("=" * 50)
+
+    tests = [
+        ("Interleaved Iterators", test_interleaved_iterators),
+        ("Detector State", test_iterator_keeps_detector_state),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {e}")
+
+    print("\n" + "=" * 50)
+    print(f"Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
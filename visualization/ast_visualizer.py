@@ -1,143 +1,261 @@
 import ast
 import sys
 import os
+import types
+import hashlib
+import shutil
+import tempfile
 
-# Global set to store executed line numbers for the current trace
-_executed_lines = set()
+# PEP 669 low-overhead monitoring (Python 3.12+); older versions fall back to settrace
+_MONITORING = getattr(sys, "monitoring", None)
 
-def _trace_calls(frame, event, arg):
-    if event == 'line':
-        _executed_lines.add(frame.f_lineno)
-    return _trace_calls
+def _make_line_tracer(executed_lines):
+    """
+    settrace hook marking executed line numbers in a bytearray bitmap
+    (executed_lines[lineno] = 1). The bitmap is bound as a default argument so
+    each line event is one indexed store, with no global lookup or set insert;
+    lines past its end (frames from other files) are ignored.
+    """
+    def trace_calls(frame, event, arg, _executed=executed_lines):
+        if event == 'line':
+            try:
+                _executed[frame.f_lineno] = 1
+            except IndexError:
+                pass
+        return trace_calls
+    return trace_calls
+
+def _code_objects(code):
+    """The module code object plus every nested function/class/comprehension body."""
+    stack = [code]
+    while stack:
+        code = stack.pop()
+        yield code
+        stack.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+
+def _acquire_monitoring_tool(name):
+    for tool in (_MONITORING.COVERAGE_ID, _MONITORING.DEBUGGER_ID, 3, 4):
+        try:
+            _MONITORING.use_tool_id(tool, name)
+            return tool
+        except ValueError:
+            continue
+    return None
+
+def exec_many_with_line_coverage(runs):
+    """
+    Execute several (source, executed_lines, namespace, filename) runs one after
+    another under a single coverage session: the settrace hook or sys.monitoring
+    tool is set up and torn down once for the whole batch. Each executed line of a
+    run's own code is marked in that run's executed_lines bitmap (lines of other
+    code, e.g. imported modules, are not). On Python 3.12+ LINE events are enabled
+    only on the runs' code objects via sys.monitoring, and each callback returns
+    DISABLE so a line fires once; otherwise (or if no monitoring tool id is free)
+    a settrace hook is used. source may be text or an already parsed ast.Module.
+    Returns, per run, the Exception it raised (None if it completed).
+    """
+    errors = [None] * len(runs)
+    jobs = []  # (run index, module code, its code objects, namespace)
+    bitmaps = {}  # id(code object) -> bitmap of the run it belongs to
+    for idx, (source, executed_lines, namespace, filename) in enumerate(runs):
+        try:
+            code = compile(source, filename, "exec")
+        except Exception as e:
+            errors[idx] = e
+            continue
+        codes = list(_code_objects(code))
+        for c in codes:
+            bitmaps[id(c)] = executed_lines
+        jobs.append((idx, code, codes, namespace))
+
+    def run_all():
+        for idx, code, _, namespace in jobs:
+            try:
+                exec(code, namespace)
+            except Exception as e:
+                errors[idx] = e
+
+    tool = _acquire_monitoring_tool("ast_visualizer") if _MONITORING is not None else None
+    if tool is None:
+        # frames of foreign code get no local tracer, so they raise no line events
+        tracers = {key: _make_line_tracer(bitmap) for key, bitmap in bitmaps.items()}
+
+        def trace_dispatch(frame, event, arg, _tracers=tracers):
+            return _tracers.get(id(frame.f_code))
 
-def _generate_mermaid_ast(node, executed_lines):
+        sys.settrace(trace_dispatch)
+        try:
+            run_all()
+        finally:
+            sys.settrace(None)
+        return errors
+
+    LINE, DISABLE = _MONITORING.events.LINE, _MONITORING.DISABLE
+
+    def on_line(code, lineno, _bitmaps=bitmaps):
+        try:
+            _bitmaps[id(code)][lineno] = 1
+        except IndexError:
+            pass
+        return DISABLE
+
+    codes = [c for job in jobs for c in job[2]]
+    try:
+        _MONITORING.register_callback(tool, LINE, on_line)
+        for c in codes:
+            _MONITORING.set_local_events(tool, c, LINE)
+        run_all()
+    finally:
+        for c in codes:
+            _MONITORING.set_local_events(tool, c, 0)
+        _MONITORING.register_callback(tool, LINE, None)
+        _MONITORING.free_tool_id(tool)
+    return errors
+
+def exec_with_line_coverage(source, executed_lines, namespace, filename="<string>"):
+    """
+    exec(source, namespace), marking each executed line number of source in
+    the executed_lines bitmap (see exec_many_with_line_coverage). Exceptions
+    from the executed code propagate.
     """
-    Generates a simplified Mermaid graph definition for the AST.
+    error = exec_many_with_line_coverage([(source, executed_lines, namespace, filename)])[0]
+    if error is not None:
+        raise error
+
+# .mmd output is streamed line by line through a large buffer instead of being
+# joined into one string first
+MERMAID_WRITE_BUFFER = 1 << 20
+
+def _write_mermaid(output_file, generate, *args):
+    """Run generate(*args, write) straight into output_file; a partial file is removed on failure."""
+    try:
+        with open(output_file, "w", buffering=MERMAID_WRITE_BUFFER) as f:
+            generate(*args, f.write)
+    except BaseException:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return output_file
+
+# Nodes to explicitly include (Control flow & Structure); everything else is
+# skipped and its children attach to the nearest drawn ancestor
+_MERMAID_INCLUDE_TYPES = frozenset({
+    'Module', 'ClassDef', 'FunctionDef', 'AsyncFunctionDef',
+    'If', 'For', 'AsyncFor', 'While', 'Try', 'ExceptHandler',
+    'Return', 'Raise', 'Break', 'Continue', 'Call', 'Assign', 'AugAssign'
+})
+
+def _named_label(node_type, node):
+    return f"{node_type}\\n{node.name}"
+
+def _call_label(node_type, node):
+    # Try to get function name
+    func = node.func
+    if type(func) is ast.Name:
+        return f"{node_type}\\n{func.id}()"
+    if type(func) is ast.Attribute:
+        return f"{node_type}\\n.{func.attr}()"
+    return f"{node_type}\\nCall"
+
+# Included node types whose label carries more than the type name
+_MERMAID_LABELS = {
+    'ClassDef': _named_label,
+    'FunctionDef': _named_label,
+    'AsyncFunctionDef': _named_label,
+    'ExceptHandler': _named_label,
+    'Call': _call_label,
+}
+
+def _generate_mermaid_ast(node, executed_lines, write):
+    """
+    Streams a simplified Mermaid graph definition for the AST through write().
     Highlights nodes that correspond to executed lines.
     """
-    lines = ["graph TD"]
-    
-    # Nodes to skip to simplify the graph
-    SKIP_TYPES = {
-        'Load', 'Store', 'Del', 'arguments', 'arg', 'alias', 'keyword',
-        'Expr', 'Attribute', 'Name', 'Constant', 'Str', 'Num', 'NameConstant'
-    }
-    
-    # Nodes to explicitly include (Control flow & Structure)
-    INCLUDE_TYPES = {
-        'Module', 'ClassDef', 'FunctionDef', 'AsyncFunctionDef',
-        'If', 'For', 'AsyncFor', 'While', 'Try', 'ExceptHandler',
-        'Return', 'Raise', 'Break', 'Continue', 'Call', 'Assign', 'AugAssign'
-    }
+    write("graph TD")
+    include = _MERMAID_INCLUDE_TYPES
+    labels = _MERMAID_LABELS
+    AST = ast.AST
 
     def walk(node, parent_id=None):
         node_type = type(node).__name__
-        
-        # Simplification Logic
-        should_show = node_type in INCLUDE_TYPES
-        
-        # If it's a Call, we definitely want to show it
-        # If it's a structural node, show it
-        
-        if not should_show:
-            # If we skip this node, we still might want to process its children
-            # but we need to connect parent to children directly?
-            # Or just stop recursion? 
-            # Better approach: Only traverse and draw "Interesting" nodes.
-            # But we need to maintain the tree structure.
-            
-            # Alternative: Just recurse but don't draw THIS node?
-            # If we don't draw this node, we pass parent_id to children.
-            pass
-        
-        node_id = str(id(node))
-        
-        if should_show:
-            # Label for the node
-            label = node_type
-            if hasattr(node, 'name'):
-                label += f"\\n{node.name}"
-            elif hasattr(node, 'id'):
-                label += f"\\n{node.id}"
-            elif isinstance(node, ast.Call):
-                # Try to get function name
-                if isinstance(node.func, ast.Name):
-                    label += f"\\n{node.func.id}()"
-                elif isinstance(node.func, ast.Attribute):
-                    label += f"\\n.{node.func.attr}()"
-                else:
-                    label += "\\nCall"
-
-            lines.append(f'    {node_id}["{label}"]')
+        if node_type in include:
+            node_id = str(id(node))
+            label_fn = labels.get(node_type)
+            label = label_fn(node_type, node) if label_fn is not None else node_type
+            write(f'\n    {node_id}["{label}"]')
             
             # Edge from parent
             if parent_id:
-                lines.append(f"    {parent_id} --> {node_id}")
+                write(f"\n    {parent_id} --> {node_id}")
                 
-            # Highlight if executed
-            if hasattr(node, 'lineno') and node.lineno in executed_lines:
-                lines.append(f"    style {node_id} fill:#9f9,stroke:#333,stroke-width:2px")
+            # Highlight if executed (Module has no lineno)
+            if node_type != 'Module' and executed_lines[node.lineno]:
+                write(f"\n    style {node_id} fill:#9f9,stroke:#333,stroke-width:2px")
             
             # Update parent_id for children
-            current_parent_id = node_id
-        else:
-            # If we don't show this node, children connect to *our* parent
-            current_parent_id = parent_id
-
-        # Recurse
-        for field, value in ast.iter_fields(node):
-            if isinstance(value, list):
+            parent_id = node_id
+        # Recurse (inlined ast.iter_child_nodes); if we don't show this node,
+        # children connect to *our* parent
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if type(value) is list:
                 for item in value:
-                    if isinstance(item, ast.AST):
-                        walk(item, current_parent_id)
-            elif isinstance(value, ast.AST):
-                walk(value, current_parent_id)
+                    if isinstance(item, AST):
+                        walk(item, parent_id)
+            elif isinstance(value, AST):
+                walk(value, parent_id)
 
     walk(node)
-    return "\n".join(lines)
 
 def generate_ast_diagram(target_file):
     """
     Runs the target file, captures execution trace, and generates a .mmd file.
     Returns the path to the generated diagram or None on failure.
     """
-    global _executed_lines
-    if not os.path.exists(target_file):
-        return None
+    return generate_ast_diagrams([target_file])[0]
 
-    # Clear previous trace
-    _executed_lines.clear()
-
-    # 1. Parse AST
-    try:
-        with open(target_file, "r") as f:
-            source = f.read()
-        tree = ast.parse(source)
-    except Exception as e:
-        print(f"Failed to parse {target_file}: {e}")
-        return None
+def generate_ast_diagrams(target_files):
+    """
+    generate_ast_diagram for many files, executing them all under one coverage
+    session instead of setting tracing up per file.
+    Returns the diagram path (or None on failure) for each file, in order.
+    """
+    # 1. Parse ASTs
+    parsed = []  # (tree, executed-lines bitmap) or None per file
+    for target_file in target_files:
+        if not os.path.exists(target_file):
+            parsed.append(None)
+            continue
+        try:
+            with open(target_file, "r") as f:
+                source = f.read()
+            tree = ast.parse(source, filename=target_file)
+        except Exception as e:
+            print(f"Failed to parse {target_file}: {e}")
+            parsed.append(None)
+            continue
+        parsed.append((tree, bytearray(len(source.splitlines()) + 1)))
 
-    # 2. Run code with tracer
-    # We use a separate global variable for the tracer to access
-    
-    sys.settrace(_trace_calls)
-    try:
-        # Execute in a restricted namespace to avoid side effects
-        exec(source, {'__name__': '__main__'})
-    except Exception:
-        # Ignore runtime errors during tracing (we just want coverage)
-        pass
-    finally:
-        sys.settrace(None)
+    # 2. Run each file with line coverage, recording executed lines in its own bitmap.
+    # Execute in restricted namespaces to avoid side effects; runtime errors are
+    # ignored (we just want coverage)
+    exec_many_with_line_coverage([
+        (item[0], item[1], {'__name__': '__main__'}, target_file)
+        for target_file, item in zip(target_files, parsed) if item is not None
+    ])
 
-    # 3. Generate Diagram
-    mermaid_code = _generate_mermaid_ast(tree, _executed_lines)
-    
-    output_file = target_file + ".mmd"
-    with open(output_file, "w") as f:
-        f.write(mermaid_code)
-        
-    return output_file
+    # 3. Generate Diagrams
+    outputs = []
+    for target_file, item in zip(target_files, parsed):
+        if item is None:
+            outputs.append(None)
+            continue
+        try:
+            outputs.append(_write_mermaid(target_file + ".mmd", _generate_mermaid_ast, *item))
+        except Exception as e:
+            print(f"Failed to write diagram for {target_file}: {e}")
+            outputs.append(None)
+    return outputs
 
 # Java Support
 try:
@@ -146,65 +264,103 @@ try:
 except ImportError:
     JAVALANG_AVAILABLE = False
 
-def _generate_mermaid_java_ast(node, executed_methods):
+# Java nodes to include
+_JAVA_INCLUDE_TYPES = frozenset({
+    'ClassDeclaration', 'MethodDeclaration', 'ConstructorDeclaration',
+    'IfStatement', 'WhileStatement', 'ForStatement', 'DoStatement',
+    'TryStatement', 'CatchClause', 'ThrowStatement', 'ReturnStatement',
+    'MethodInvocation', 'ClassCreator', 'Assignment'
+})
+
+def _java_label(node_type, node):
+    if hasattr(node, 'name'):
+        return f"{node_type}\\n{node.name}"
+    if node_type == 'MethodInvocation' and hasattr(node, 'member'):
+        return f"{node_type}\\n.{node.member}()"
+    return node_type
+
+def _generate_mermaid_java_ast(node, executed_methods, write):
     """
-    Generates a simplified Mermaid graph for Java AST.
+    Streams a simplified Mermaid graph for Java AST through write().
     Highlights MethodDeclaration nodes if they are in executed_methods.
     """
-    lines = ["graph TD"]
-    
-    # Java nodes to include
-    INCLUDE_TYPES = {
-        'ClassDeclaration', 'MethodDeclaration', 'ConstructorDeclaration',
-        'IfStatement', 'WhileStatement', 'ForStatement', 'DoStatement',
-        'TryStatement', 'CatchClause', 'ThrowStatement', 'ReturnStatement',
-        'MethodInvocation', 'ClassCreator', 'Assignment'
-    }
-    
-    def walk(node, parent_id=None):
-        node_id = str(id(node))
+    write("graph TD")
+    include = _JAVA_INCLUDE_TYPES
+    Node = javalang.ast.Node
+
+    # Iterative pre-order walk (same node order as recursion, no frame per node);
+    # each entry is (node, id of the nearest drawn ancestor)
+    stack = [(node, None)]
+    while stack:
+        node, parent_id = stack.pop()
         node_type = type(node).__name__
-        
-        should_show = node_type in INCLUDE_TYPES
-        
-        if should_show:
-            label = node_type
-            if hasattr(node, 'name'):
-                label += f"\\n{node.name}"
-            elif node_type == 'MethodInvocation':
-                if hasattr(node, 'member'):
-                    label += f"\\n.{node.member}()"
-            
-            lines.append(f'    {node_id}["{label}"]')
+        if node_type in include:
+            node_id = str(id(node))
+            write(f'\n    {node_id}["{_java_label(node_type, node)}"]')
             
             if parent_id:
-                lines.append(f"    {parent_id} --> {node_id}")
+                write(f"\n    {parent_id} --> {node_id}")
                 
             # Highlight executed methods
             if node_type == 'MethodDeclaration' and node.name in executed_methods:
-                 lines.append(f"    style {node_id} fill:#9f9,stroke:#333,stroke-width:2px")
+                write(f"\n    style {node_id} fill:#9f9,stroke:#333,stroke-width:2px")
             
-            current_parent_id = node_id
-        else:
-            current_parent_id = parent_id
+            parent_id = node_id
         
-        # Recurse
-        if hasattr(node, 'children'):
-            if isinstance(node, (javalang.ast.Node, list, tuple)):
-                children = node if isinstance(node, (list, tuple)) else node.children
-                if children:
-                    for child in children:
-                        if isinstance(child, (list, tuple)):
-                            for item in child:
-                                if isinstance(item, javalang.ast.Node):
-                                    walk(item, current_parent_id)
-                        elif isinstance(child, javalang.ast.Node):
-                            walk(child, current_parent_id)
+        if not isinstance(node, Node):
+            continue
+        # Node children, with one level of list/tuple fields flattened
+        # (node.children inlined: it rebuilds a list of every attr per call)
+        children = []
+        for attr in node.attrs:
+            child = getattr(node, attr)
+            if isinstance(child, Node):
+                children.append(child)
+            elif isinstance(child, (list, tuple)):
+                for item in child:
+                    if isinstance(item, Node):
+                        children.append(item)
+        stack.extend([(child, parent_id) for child in reversed(children)])
 
-    walk(node)
-    return "\n".join(lines)
+# BCI traces reused across runs live under <cache_dir>/java_traces
+JAVA_TRACE_CACHE_SUBDIR = "java_traces"
+
+def _java_trace_cache_path(cache_dir, target_file, bci_jar_path):
+    """
+    Cache slot for the BCI trace of target_file, keyed on the source file and the
+    agent jar (path, mtime, size), so editing either forces a fresh run.
+    None if either file can't be stat'ed.
+    """
+    try:
+        src, jar = os.stat(target_file), os.stat(bci_jar_path)
+    except OSError:
+        return None
+    key = f"{os.path.abspath(target_file)}:{src.st_mtime_ns}:{src.st_size}:{jar.st_mtime_ns}:{jar.st_size}"
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, JAVA_TRACE_CACHE_SUBDIR, f"{digest}.csv")
 
-def generate_java_ast_diagram(target_file, bci_jar_path="bci_injector.jar"):
+def _store_java_trace(trace_file, cached_trace):
+    """Copy a fresh trace into the cache; written under a temp name and renamed, so readers never see half a file."""
+    try:
+        os.makedirs(os.path.dirname(cached_trace), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cached_trace), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(trace_file, tmp_path)
+            os.replace(tmp_path, cached_trace)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass
+
+def generate_java_ast_diagram(target_file, bci_jar_path="bci_injector.jar", cache_dir=None):
+    """
+    Runs the Java file under the BCI agent and generates a .mmd file highlighting
+    executed methods. With cache_dir, the trace of an unchanged file (and jar) is
+    reused instead of compiling and launching the JVM again.
+    Returns the path to the generated diagram or None on failure.
+    """
     if not JAVALANG_AVAILABLE:
         print("javalang not installed, skipping Java visualization")
         return None
@@ -221,25 +377,26 @@ def generate_java_ast_diagram(target_file, bci_jar_path="bci_injector.jar"):
         print(f"Failed to parse Java file {target_file}: {e}")
         return None
 
-    # 2. Run BCI to get trace
+    # 2. Run BCI to get trace (or reuse the cached one)
     # We need to import the collector here to avoid circular imports if possible, 
     # or just use subprocess if we want to be safe, but importing is better.
     from bci_tracing.java_trace_collector import JavaTraceCollector
     
     collector = JavaTraceCollector(bci_jar_path)
-    result = collector.run_java_with_bci(target_file)
+    cached_trace = _java_trace_cache_path(cache_dir, target_file, bci_jar_path) if cache_dir else None
+    if cached_trace is not None and os.path.exists(cached_trace):
+        trace_file = cached_trace
+    else:
+        result = collector.run_java_with_bci(target_file)
+        trace_file = result['trace_file'] if result['success'] else None
+        if trace_file and cached_trace is not None:
+            _store_java_trace(trace_file, cached_trace)
     
     executed_methods = set()
-    if result['success'] and result['trace_file']:
-        analysis = collector.analyze_trace_file(result['trace_file'])
+    if trace_file:
+        analysis = collector.analyze_trace_file(trace_file)
         # analysis['method_counts'] keys are method names
         executed_methods = set(analysis.get('method_counts', {}).keys())
     
     # 3. Generate Diagram
-    mermaid_code = _generate_mermaid_java_ast(tree, executed_methods)
-    
-    output_file = target_file + ".mmd"
-    with open(output_file, "w") as f:
-        f.write(mermaid_code)
-        
-    return output_file
+    return _write_mermaid(target_file + ".mmd", _generate_mermaid_java_ast, tree, executed_methods)
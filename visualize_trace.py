@@ -2,20 +2,14 @@ import ast
 import sys
 import os
 
-# Global set to store executed line numbers
-executed_lines = set()
+from visualization.ast_visualizer import exec_with_line_coverage, MERMAID_WRITE_BUFFER
 
-def trace_calls(frame, event, arg):
-    if event == 'line':
-        executed_lines.add(frame.f_lineno)
-    return trace_calls
-
-def generate_mermaid_ast(node, executed_lines):
+def generate_mermaid_ast(node, executed_lines, write):
     """
-    Generates a Mermaid graph definition for the AST.
+    Streams a Mermaid graph definition for the AST through write().
     Highlights nodes that correspond to executed lines.
     """
-    lines = ["graph TD"]
+    write("graph TD")
     
     def walk(node, parent_id=None):
         node_id = str(id(node))
@@ -30,15 +24,15 @@ def generate_mermaid_ast(node, executed_lines):
         elif isinstance(node, ast.Constant):
             label += f"\\n({node.value})"
             
-        lines.append(f'    {node_id}["{label}"]')
+        write(f'\n    {node_id}["{label}"]')
         
         # Edge from parent
         if parent_id:
-            lines.append(f"    {parent_id} --> {node_id}")
+            write(f"\n    {parent_id} --> {node_id}")
             
         # Highlight if executed
-        if hasattr(node, 'lineno') and node.lineno in executed_lines:
-            lines.append(f"    style {node_id} fill:#9f9,stroke:#333,stroke-width:2px")
+        if hasattr(node, 'lineno') and executed_lines[node.lineno]:
+            write(f"\n    style {node_id} fill:#9f9,stroke:#333,stroke-width:2px")
         
         # Recurse
         for field, value in ast.iter_fields(node):
@@ -50,7 +44,6 @@ def generate_mermaid_ast(node, executed_lines):
                 walk(value, node_id)
 
     walk(node)
-    return "\n".join(lines)
 
 def main():
     if len(sys.argv) < 2:
@@ -66,28 +59,24 @@ def main():
     # 1. Parse AST
     with open(target_file, "r") as f:
         source = f.read()
-    tree = ast.parse(source)
+    tree = ast.parse(source, filename=target_file)
 
     # 2. Run code with tracer
     print(f"[*] Running {target_file} with trace...")
-    sys.settrace(trace_calls)
+    executed_lines = bytearray(len(source.splitlines()) + 1)
     try:
         # We execute the code in a separate namespace to avoid polluting ours
-        exec(source, {})
+        exec_with_line_coverage(tree, executed_lines, {}, target_file)
     except Exception as e:
         print(f"Execution error (expected for buggy files): {e}")
-    finally:
-        sys.settrace(None)
 
-    print(f"[*] Executed lines: {sorted(list(executed_lines))}")
+    print(f"[*] Executed lines: {[lineno for lineno, hit in enumerate(executed_lines) if hit]}")
 
     # 3. Generate Diagram
     print("[*] Generating Mermaid diagram...")
-    mermaid_code = generate_mermaid_ast(tree, executed_lines)
-    
     output_file = target_file + ".mmd"
-    with open(output_file, "w") as f:
-        f.write(mermaid_code)
+    with open(output_file, "w", buffering=MERMAID_WRITE_BUFFER) as f:
+        generate_mermaid_ast(tree, executed_lines, f.write)
     
     print(f"[*] Diagram saved to {output_file}")
     print("    (You can view this file in a Mermaid Live Editor or VS Code extension)")